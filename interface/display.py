@@ -10,6 +10,7 @@ from tools.text_inactive_tool.text_inactive import main as run_text_inactive
 from tools.phone_cleanup_tool.clean_up import main as run_clean_up
 from tools.pipedrive_automation_tool.pipedrive_automation import main as run_automation
 from tools.autodialer_cleanup_tool.cleanup_autodialer import main as run_autodialer
+from tools.autodialer_cleanup_tool.output_writer import parse_shard_rows
 from tools.missing_deals_tool.missing_deals import main as run_missing_deals
 from tools.missing_deals_tool.lookup import main as run_missing_deals_lookup
 from tools.marketing_cleanup_tool.marketing_clean_up import main as run_marketing_cleanup
@@ -1082,6 +1083,17 @@ class AutoDialerCleaner(ctk.CTkFrame):
             re_cleaning_button = ctk.CTkRadioButton(switch_frame, text="Text Marketing - Re-Cleaning", variable=selected_mode, value="recleaning")
             re_cleaning_button.grid(row=0, column=3, padx=5, sticky="nsew")
 
+            # Optional splitting of the outputs into dialer-sized files, left blank for one file per list
+            shard_rows_label = ctk.CTkLabel(switch_frame, text="Rows per file: ")
+            shard_rows_label.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
+            shard_rows_entry = ctk.CTkEntry(switch_frame, placeholder_text="All rows")
+            shard_rows_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+
+            shard_column_label = ctk.CTkLabel(switch_frame, text="Split by column: ")
+            shard_column_label.grid(row=1, column=2, padx=5, pady=5, sticky="nsew")
+            shard_column_entry = ctk.CTkEntry(switch_frame, placeholder_text="None")
+            shard_column_entry.grid(row=1, column=3, padx=5, pady=5, sticky="ew")
+
             run_tool_button = ctk.CTkButton(self,
                                             text='RUN TOOL',
                                             height=36,
@@ -1091,13 +1103,22 @@ class AutoDialerCleaner(ctk.CTkFrame):
                                             text_color='#141414',
                                             corner_radius=50,
                                             font=ctk.CTkFont(size=18, weight='bold'),
-                                            command=lambda:self.controller.trigger_tool(run_autodialer,
-                                                                                        self.auth_code,
-                                                                                        self.files_to_clean,
-                                                                                        self.save_path,
-                                                                                        selected_mode.get()))
+                                            command=lambda:self.controller.trigger_tool(self.run_autodialer_tool,
+                                                                                        selected_mode.get(),
+                                                                                        shard_rows_entry.get(),
+                                                                                        shard_column_entry.get()))
             run_tool_button.grid(row=8, column=0, padx=10, pady=5)
 
+    def run_autodialer_tool(self, run_mode: str, shard_rows: str, shard_column: str):
+
+        # The output options are read in the tool thread, so a bad value is reported as a failed run
+        run_autodialer(self.auth_code,
+                       self.files_to_clean,
+                       self.save_path,
+                       run_mode,
+                       shard_rows=parse_shard_rows(shard_rows),
+                       shard_column=shard_column.strip() or None)
+
     def update_list_cleaner(self):
         if self.auth_code:
             self.controller.trigger_tool(update_list_cleaner_file, self.auth_code, self)
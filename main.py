@@ -2,6 +2,7 @@ import os
 import requests
 import shutil
 import subprocess
+import multiprocessing
 import sys
 from dotenv import load_dotenv
 from interface.display import main as start_ui
@@ -84,4 +85,6 @@ def main():
         start_ui()
 
 if __name__ == "__main__":
+    # Worker processes of the frozen executable start here
+    multiprocessing.freeze_support()
     main()
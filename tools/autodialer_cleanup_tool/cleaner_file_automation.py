@@ -1,14 +1,20 @@
 import re
 import os
+import time
+import concurrent.futures
+import numpy as np
 import pandas as pd
 import warnings
 import dropbox
+import requests
 import webbrowser
 import customtkinter as ctk
-from datetime import timedelta
 from dotenv import load_dotenv
+from functools import partial
 from io import BytesIO
 from openpyxl import load_workbook
+from tools.phone_cleanup_tool.list_cleaner import LIST_CLEANER_MANIFEST_PATH, download_list_cleaner, local_file_state, read_manifest, write_manifest
+from tools.autodialer_cleanup_tool.list_cleaner_sources import SourceContribution, SourceManifest, outbound_events, outbound_windows
 
 warnings.simplefilter(action='ignore', category=pd.errors.SettingWithCopyWarning)
 warnings.simplefilter("ignore", UserWarning)
@@ -16,6 +22,45 @@ load_dotenv(dotenv_path='misc/.env')
 APP_KEY = os.getenv('DROPBOX_APP_KEY')
 APP_SECRET = os.getenv('DROPBOX_APP_SECRET')
 
+# Downloads of source exports that run at once, all on the one Dropbox client
+MAX_DOWNLOADS = 4
+DOWNLOAD_RETRIES = 3
+RETRYABLE_ERRORS = (
+    dropbox.exceptions.InternalServerError,
+    dropbox.exceptions.RateLimitError,
+    requests.exceptions.RequestException
+)
+
+MVP_SHEET = "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)"
+DNC_SHEET = "DNC (Cold-PD)"
+DB_ID_SHEET = "UniqueDB ID (Cold)"
+OUTBOUND_SHEET = "CallOut-14d+TextOut-30d (Cold)"
+OUTBOUND_SEVEN_DAYS_SHEET = "CallTextOut-7d (PD)"
+CONV_SHEET = "PDConvDup (PD)"
+PD_JR_AA_SHEET = "PDJRAADups (PD)"
+
+# Sheets that keep growing from run to run, the outbound sheets are rebuilt every run instead
+BASE_SHEETS = [MVP_SHEET, DNC_SHEET, DB_ID_SHEET, CONV_SHEET, PD_JR_AA_SHEET]
+
+# Sheets that only hold the rows of the latest export
+REPLACED_SHEETS = (PD_JR_AA_SHEET,)
+
+PD_PHONE_COLUMNS = [f'Person - Phone {i}' for i in range(1, 11)]
+PD_DUPLICATE_PHONE_COLUMNS = [f'Person - Phone {i}' for i in range(2, 11)] + [
+    'Person - Phone - Work',
+    'Person - Phone - Home',
+    'Person - Phone - Mobile',
+    'Person - Phone - Other',
+    'Person - Archive - Phone'
+]
+
+# Separates the cells of a Pipedrive export once they are joined into one text
+CELL_SEPARATOR = '\x00'
+
+# A phone is 10 digits with an optional leading '+', alone between commas or cell boundaries
+# once the surrounding whitespace is ignored
+PD_PHONE_PATTERN = re.compile(r'(?<![^,\x00])\s*\+?([0-9]{10})\s*(?![^,\x00])')
+
 # def append_to_multiple_sheets(update_df, sheet_name, excel_path: str):
 #     print("Saving all sheets")
 #     sheet = excel_workbook[sheet_name]
@@ -27,25 +72,21 @@ APP_SECRET = os.getenv('DROPBOX_APP_SECRET')
 #     # Save the workbook after processing all sheets
 #     excel_workbook.save(excel_path)
 
-def save_all_files():
+def save_all_files(local_data_path: str, sheets: dict, contributions: list):
     print("Saving all CSV files")
-    global mvp_df, dnc_df, conv_df, db_id_df, pd_jr_aa_df
-    final_df = pd.DataFrame(sum(outbound_df_list, []))
-    final_df.drop_duplicates(inplace=True)
 
-    final_seven_df = pd.DataFrame(sum(outbound_seven_days_list, []))
-    final_seven_df.drop_duplicates(inplace=True)
+    # The outbound windows are measured now, so contacts made by unchanged exports still expire
+    outbound_phones, outbound_seven_phones = outbound_windows(contributions)
+    final_df = pd.DataFrame({0: outbound_phones})
+    final_seven_df = pd.DataFrame({0: outbound_seven_phones})
     
     # with pd.ExcelWriter(excel_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
     #     final_df.to_excel(writer, sheet_name='CallOut-14d+TextOut-30d', index=False, header=False)
 
-    final_df.to_csv('./data/CallOut-14d+TextOut-30d (Cold).csv', index=False, header=None)
-    final_seven_df.to_csv('./data/CallTextOut-7d (PD).csv', index=False, header=None)
-    mvp_df.drop_duplicates().dropna().to_csv('./data/CCM+CH+MVPC+MVPT+JC+RC+PD (Cold).csv', index=False, header=None)
-    dnc_df.drop_duplicates().dropna().to_csv('./data/DNC (Cold-PD).csv', index=False, header=None)
-    conv_df.drop_duplicates().dropna().to_csv('./data/PDConvDup (PD).csv', index=False, header=None)
-    db_id_df.drop_duplicates().dropna().to_csv('./data/UniqueDB ID (Cold).csv', index=False, header=None)
-    pd_jr_aa_df.drop_duplicates().dropna().to_csv('./data/PDJRAADups (PD).csv', index=False, header=None)
+    final_df.to_csv(f'{local_data_path}/{OUTBOUND_SHEET}.csv', index=False, header=None)
+    final_seven_df.to_csv(f'{local_data_path}/{OUTBOUND_SEVEN_DAYS_SHEET}.csv', index=False, header=None)
+    for sheet_name, df in sheets.items():
+        df.drop_duplicates().dropna().to_csv(f'{local_data_path}/{sheet_name}.csv', index=False, header=None)
 
 def get_update_df(update_df: pd.DataFrame, sheet_name: str):
     pass
@@ -65,27 +106,43 @@ def dropbox_authentication() -> str:
     if authorize_url:
         webbrowser.open(authorize_url)
 
-def export_to_dropbox(root_path: str, local_data_path: str, dbx: dropbox.Dropbox) -> None:
+def export_to_dropbox(root_path: str, local_data_path: str, dbx: dropbox.Dropbox) -> dict:
 
     print("Uploading to List Cleaner Files to Dropbox")
     sheet_names = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)",
-        "DNC (Cold-PD)",
-        "UniqueDB ID (Cold)",
-        "CallOut-14d+TextOut-30d (Cold)",
-        "CallTextOut-7d (PD)",
-        "PDConvDup (PD)",
-        "PDJRAADups (PD)"
+        MVP_SHEET,
+        DNC_SHEET,
+        DB_ID_SHEET,
+        OUTBOUND_SHEET,
+        OUTBOUND_SEVEN_DAYS_SHEET,
+        CONV_SHEET,
+        PD_JR_AA_SHEET
     ]
 
+    # The local files are the revisions just uploaded, so they are recorded as up to date
+    # and the next run does not download them again
+    manifest = read_manifest(LIST_CLEANER_MANIFEST_PATH)
+    uploaded = {}
+
     for sheet_name in sheet_names:
-        dropbox_path = f"{root_path}/{sheet_name}.csv"
-        local_file_path = f"{local_data_path}/{sheet_name}.csv"
+        file_name = f"{sheet_name}.csv"
+        dropbox_path = f"{root_path}/{file_name}"
+        local_file_path = f"{local_data_path}/{file_name}"
 
         with open(local_file_path, 'rb') as f:
-            dbx.files_upload(f.read(), dropbox_path, mode=dropbox.files.WriteMode.overwrite)
+            metadata = dbx.files_upload(f.read(), dropbox_path, mode=dropbox.files.WriteMode.overwrite)
+
+        manifest[file_name] = {
+            'rev': metadata.rev,
+            'content_hash': metadata.content_hash,
+            'local': local_file_state(local_file_path)
+        }
+        uploaded[file_name] = metadata.content_hash
+
+    write_manifest(manifest, LIST_CLEANER_MANIFEST_PATH)
 
     print("Sucessfully uploaded Updated List Cleaner Files to Dropbox")
+    return uploaded
 
 def read_dropbox_file(path: str, dbx):
     metadata, response = dbx.files_download(path)
@@ -96,56 +153,30 @@ def read_dropbox_file(path: str, dbx):
     else:
         raise ValueError("Invalid file format: Please provide a .csv, .xlsx or .xlsb file.")
     
-def add_pd_phones(path: str, dbx):
+def extract_pd_phones(df: pd.DataFrame, phone_columns: list) -> pd.DataFrame:
+
+    # The phone cells are read column by column and joined into one text, so a single regex
+    # pass finds every comma separated phone instead of a Python loop over the cells
+    cells = df[phone_columns].to_numpy(dtype=object).ravel(order='F')
+    cells = cells[pd.notna(cells)]
+    text = CELL_SEPARATOR.join(map(str, cells)).replace('.0', '')  # Remove `.0` from floats
+
+    phones = np.array(PD_PHONE_PATTERN.findall(text), dtype=np.int64)
+    return pd.DataFrame({0: pd.unique(phones)})
+
+def add_pd_phones(df: pd.DataFrame) -> SourceContribution:
     print("Processing Pipedrive Phones Export")
-    global mvp_df
-    df = read_dropbox_file(path, dbx)
-    df.drop(columns=['Deal - ID', 'Deal - Last RVM Date', 'Deal - RVM Dates'],
-            axis=1,
-            inplace=True)
-
-    # Select only the phone columns (Phone 1 to Phone 10)
-    phone_columns = [f'Person - Phone {i}' for i in range(1, 11)]
-    phones_df = df[phone_columns]
-
-    # Initialize a list to hold all phone numbers
-    all_phone_numbers = []
-
-    # Iterate over each column and each row to extract phone numbers
-    for column in phone_columns:
-        phones_df[column] = phones_df[column].fillna('')  # Replace NaN with an empty string
-        for phone_entry in phones_df[column]:
-            # Convert each entry to a string, handle floats (remove .0), and split comma-separated values
-            phone_entry = str(phone_entry).replace('.0', '')  # Remove `.0` from floats
-            valid_phone_pattern = re.compile(r'^\+?\d{10}$')  # A simple pattern for phone numbers (you can adjust it)
-            all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip() and valid_phone_pattern.match(phone.strip())])
-            # all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip()])
-
-    # Create a DataFrame from the extracted phone numbers
-    result_df = pd.DataFrame({'Phone Number': all_phone_numbers})
-
-    result_df['Phone Number'] = result_df['Phone Number'] \
-        .str.replace("(", "") \
-        .str.replace(")", "") \
-        .str.replace("-", "") \
-        .str.replace(" ", "")
-    
-    result_df.drop_duplicates(subset=['Phone Number'], inplace=True)
 
     # get_update_df(result_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
-    result_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, result_df], ignore_index=True)
-    result_df = None
+    return SourceContribution({MVP_SHEET: extract_pd_phones(df, PD_PHONE_COLUMNS)})
     
     # # Use ExcelWriter to append the DataFrame to the existing file
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
         
     #     result_df.to_excel(writer, sheet_name='ContMgt+MVP+JC+PD+RC', index=False)
 
-def add_unique_db(path: str, dbx):
+def add_unique_db(df: pd.DataFrame) -> SourceContribution:
     print("Processing Unique Database ID")
-    global db_id_df
-    df = read_dropbox_file(path, dbx)
     # Now handle the "Deal - Unique Database ID" column similarly
     deal_column = 'Deal - Unique Database ID'
 
@@ -168,120 +199,28 @@ def add_unique_db(path: str, dbx):
 
     # get_update_df(deal_df, 'UniqueDB ID')
     deal_df.columns = [0]
-    db_id_df = pd.concat([db_id_df, deal_df], ignore_index=True)
-    deal_df = None
+    return SourceContribution({DB_ID_SHEET: deal_df})
 
     # # Use ExcelWriter to append the DataFrame to the existing file
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
         
     #     deal_df.to_excel(writer, sheet_name='UniqueDB ID', index=False)
 
-def add_pd_jr_aa_dup(path: str, dbx):
+def add_pd_jr_aa_dup(df: pd.DataFrame) -> SourceContribution:
     print("Processing Pipedrive JR AA Duplicate")
-    global pd_jr_aa_df
-    df = read_dropbox_file(path, dbx)
-    phone_columns = [f'Person - Phone {i}' for i in range(2, 11)]
-    phone_columns.extend(['Person - Phone - Work', 'Person - Phone - Home', 'Person - Phone - Mobile', 'Person - Phone - Other', 'Person - Archive - Phone'])
-    phones_df = df[phone_columns]
-
-    all_phone_numbers = []
-
-    # Iterate over each column and each row to extract phone numbers
-    for column in phone_columns:
-        phones_df[column] = phones_df[column].fillna('')  # Replace NaN with an empty string
-        for phone_entry in phones_df[column]:
-            # Convert each entry to a string, handle floats (remove .0), and split comma-separated values
-            phone_entry = str(phone_entry).replace('.0', '')  # Remove `.0` from floats
-            valid_phone_pattern = re.compile(r'^\+?\d{10}$')  # A simple pattern for phone numbers (you can adjust it)
-            all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip() and valid_phone_pattern.match(phone.strip())])
-            # all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip()])
-
-    # Create a DataFrame from the extracted phone numbers
-    result_df = pd.DataFrame({'Phone Number': all_phone_numbers})
-
-    result_df['Phone Number'] = result_df['Phone Number'] \
-        .str.replace("(", "") \
-        .str.replace(")", "") \
-        .str.replace("-", "") \
-        .str.replace(" ", "")
-    
-    result_df.drop_duplicates(subset=['Phone Number'], inplace=True)
+    return SourceContribution({PD_JR_AA_SHEET: extract_pd_phones(df, PD_DUPLICATE_PHONE_COLUMNS)})
 
-    result_df.columns = [0]
-    pd_jr_aa_df = result_df
-    result_df = None
-
-def add_pd_conv_dup(path: str, dbx):
+def add_pd_conv_dup(df: pd.DataFrame) -> SourceContribution:
     print("Processing Pipedrive Conversion Duplicate")
-    global conv_df
-    df = read_dropbox_file(path, dbx)
-    phone_columns = [f'Person - Phone {i}' for i in range(2, 11)]
-    phone_columns.extend(['Person - Phone - Work', 'Person - Phone - Home', 'Person - Phone - Mobile', 'Person - Phone - Other', 'Person - Archive - Phone'])
-    phones_df = df[phone_columns]
-
-    all_phone_numbers = []
-
-    # Iterate over each column and each row to extract phone numbers
-    for column in phone_columns:
-        phones_df[column] = phones_df[column].fillna('')  # Replace NaN with an empty string
-        for phone_entry in phones_df[column]:
-            # Convert each entry to a string, handle floats (remove .0), and split comma-separated values
-            phone_entry = str(phone_entry).replace('.0', '')  # Remove `.0` from floats
-            valid_phone_pattern = re.compile(r'^\+?\d{10}$')  # A simple pattern for phone numbers (you can adjust it)
-            all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip() and valid_phone_pattern.match(phone.strip())])
-            # all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip()])
-
-    # Create a DataFrame from the extracted phone numbers
-    result_df = pd.DataFrame({'Phone Number': all_phone_numbers})
-
-    result_df['Phone Number'] = result_df['Phone Number'] \
-        .str.replace("(", "") \
-        .str.replace(")", "") \
-        .str.replace("-", "") \
-        .str.replace(" ", "")
-    
-    result_df.drop_duplicates(subset=['Phone Number'], inplace=True)
 
     # get_update_df(result_df, 'PDConvDup')
-    result_df.columns = [0]
-    conv_df = pd.concat([conv_df, result_df], ignore_index=True)
-    result_df = None
+    return SourceContribution({CONV_SHEET: extract_pd_phones(df, PD_DUPLICATE_PHONE_COLUMNS)})
 
-def add_remove_list(path: str, dbx):
+def add_remove_list(df: pd.DataFrame) -> SourceContribution:
     print("Processing Pipedrive Remove From List")
-    global dnc_df
-    df = read_dropbox_file(path, dbx)
-    phone_columns = [f'Person - Phone {i}' for i in range(2, 11)]
-    phone_columns.extend(['Person - Phone - Work', 'Person - Phone - Home', 'Person - Phone - Mobile', 'Person - Phone - Other', 'Person - Archive - Phone'])
-    phones_df = df[phone_columns]
-
-    all_phone_numbers = []
-
-    # Iterate over each column and each row to extract phone numbers
-    for column in phone_columns:
-        phones_df[column] = phones_df[column].fillna('')  # Replace NaN with an empty string
-        for phone_entry in phones_df[column]:
-            # Convert each entry to a string, handle floats (remove .0), and split comma-separated values
-            phone_entry = str(phone_entry).replace('.0', '')  # Remove `.0` from floats
-            valid_phone_pattern = re.compile(r'^\+?\d{10}$')  # A simple pattern for phone numbers (you can adjust it)
-            all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip() and valid_phone_pattern.match(phone.strip())])
-            # all_phone_numbers.extend([phone.strip() for phone in phone_entry.split(',') if phone.strip()])
-
-    # Create a DataFrame from the extracted phone numbers
-    result_df = pd.DataFrame({'Phone Number': all_phone_numbers})
-
-    result_df['Phone Number'] = result_df['Phone Number'] \
-        .str.replace("(", "") \
-        .str.replace(")", "") \
-        .str.replace("-", "") \
-        .str.replace(" ", "")
-    
-    result_df.drop_duplicates(subset=['Phone Number'], inplace=True)
 
     # get_update_df(result_df, 'DNC')
-    result_df.columns = [0]
-    dnc_df = pd.concat([dnc_df, result_df], ignore_index=True)
-    result_df = None
+    return SourceContribution({DNC_SHEET: extract_pd_phones(df, PD_DUPLICATE_PHONE_COLUMNS)})
 
     # book = load_workbook(excel_file)
 
@@ -301,35 +240,29 @@ def add_remove_list(path: str, dbx):
         
     #     updated_df.to_excel(writer, sheet_name='ContMgt+MVP+JC+PD+RC', index=False, header=False)
 
-def add_jc(path: str, dbx):
-    print("Processing Just Call")
-    global mvp_df
+def read_jc_file(path: str, dbx) -> pd.DataFrame:
     metadata, response = dbx.files_download(path)
-    df = pd.read_excel(BytesIO(response.content),
-                       sheet_name="Messages Details",
-                       header=6,
-                       usecols=['Client Number', 'Delivery Status', 'Datetime'],
-                       parse_dates=['Datetime'])
-    thirty_days_ago = pd.to_datetime('today', utc=True, format='mixed', dayfirst=False) - timedelta(days=30)
-    seven_days_ago = pd.to_datetime('today', utc=True, format='mixed', dayfirst=False) - timedelta(days=7)
+    return pd.read_excel(BytesIO(response.content),
+                         sheet_name="Messages Details",
+                         header=6,
+                         usecols=['Client Number', 'Delivery Status', 'Datetime'],
+                         parse_dates=['Datetime'])
+
+def add_jc(df: pd.DataFrame) -> SourceContribution:
+    print("Processing Just Call")
     df['Datetime'] = pd.to_datetime(df['Datetime'], format='mixed', dayfirst=False, utc=True)
     df['Client Number'] = df['Client Number'].astype('Int64')
     result_df = df[df['Client Number'].notna()].copy()  # Ensure we work on a copy of the filtered DataFrame
     result_df['Client Number'] = result_df['Client Number'].astype('Int64').astype(str).str[1:]
 
     received_df = result_df[result_df['Delivery Status'].str.lower() == 'received'][['Client Number']]
-    sent_df = result_df[(result_df['Delivery Status'].str.lower().isin(['sent', 'delivered'])) & (result_df['Datetime'] >= thirty_days_ago)][['Client Number']]
-    sent_seven_df = result_df[(result_df['Delivery Status'].str.lower().isin(['sent', 'delivered'])) & (result_df['Datetime'] >= seven_days_ago)][['Client Number']]
+    sent_df = result_df[result_df['Delivery Status'].str.lower().isin(['sent', 'delivered'])]
 
     received_df.drop_duplicates(subset=['Client Number'], inplace=True)
-    sent_df.drop_duplicates(subset=['Client Number'], inplace=True)
-    sent_seven_df.drop_duplicates(subset=['Client Number'], inplace=True)
 
     # get_update_df(received_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
     received_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, received_df], ignore_index=True)
 
-    received_df = None
     # get_update_df(sent_df, 'JCSMS-Sent')
 
     # # Use ExcelWriter to append the DataFrame to the existing file
@@ -339,47 +272,31 @@ def add_jc(path: str, dbx):
 
     # with pd.ExcelWriter('./data/List Cleaner.xlsx', engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
     #     sent_df.to_excel(writer, sheet_name='JCSMS-Sent', index=False, header=False)
-    outbound_df_list.append(sent_df.values.tolist())
-    sent_df = None
-
-    outbound_seven_days_list.append(sent_seven_df.values.tolist())
-    sent_seven_df = None
+    return SourceContribution({MVP_SHEET: received_df}, outbound_events(sent_df['Client Number'], sent_df['Datetime'], 30))
 
-def add_sly(path: str, dbx):
+def add_sly(df: pd.DataFrame) -> SourceContribution:
     print("Processing Sly")
-    global dnc_df
-    df = read_dropbox_file(path, dbx)
     df.drop_duplicates(inplace=True)
 
     # get_update_df(df, 'DNC')
     df.columns = [0]
-    dnc_df = pd.concat([dnc_df, df], ignore_index=True)
-
-    df = None
+    return SourceContribution({DNC_SHEET: df})
 
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
         
     #     df.to_excel(writer, sheet_name='DNC', index=False, header=False)
 
-def add_contact_center(df: pd.DataFrame, dbx):
+def add_contact_center(df: pd.DataFrame) -> SourceContribution:
     print("Processing Contact Center")
-    global mvp_df
-    fourteen_days_ago = pd.to_datetime('today', format='mixed', dayfirst=False) - timedelta(days=14)
-    seven_days_ago = pd.to_datetime('today', format='mixed', dayfirst=False) - timedelta(days=7)
     df['Date'] = pd.to_datetime(df['Date'], format='mixed', dayfirst=False)
     df = df[df['Media Type Name'] != 'E-Mail']
     inbound_df = df[df['Skill Direction'] == 'Inbound'][['ANI/From']]
-    outbound_df = df[(df['Skill Direction'] == 'Outbound') & (df['Date'] >= fourteen_days_ago)][['DNIS/To']]
-    outbound_seven_df = df[(df['Skill Direction'] == 'Outbound') & (df['Date'] >= seven_days_ago)][['DNIS/To']]
+    outbound_df = df[df['Skill Direction'] == 'Outbound']
 
     inbound_df.drop_duplicates(inplace=True)
-    outbound_df.drop_duplicates(inplace=True)
-    outbound_seven_df.drop_duplicates(inplace=True)
 
     # get_update_df(inbound_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
     inbound_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, inbound_df], ignore_index=True)
-    inbound_df = None
     # get_update_df(outbound_df, 'Outbound-2weeks')
 
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
@@ -388,38 +305,22 @@ def add_contact_center(df: pd.DataFrame, dbx):
     # with pd.ExcelWriter('./data/List Cleaner.xlsx', engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
     #     outbound_df.to_excel(writer, sheet_name='Outbound-2weeks', index=False, header=False)
 
-    outbound_df_list.append(outbound_df.values.tolist())
-    outbound_df = None
-
-    outbound_seven_days_list.append(outbound_seven_df.values.tolist())
-    outbound_seven_df = None
+    return SourceContribution({MVP_SHEET: inbound_df}, outbound_events(outbound_df['DNIS/To'], outbound_df['Date'], 14))
 
-def add_contact_history_inbound(df: pd.DataFrame, dbx):
+def add_contact_history_inbound(df: pd.DataFrame) -> SourceContribution:
     print("Processing Contact History")
-    fourteen_days_ago = pd.to_datetime('today', format='mixed', dayfirst=False) - timedelta(days=14)
-    seven_days_ago = pd.to_datetime('today', format='mixed', dayfirst=False) - timedelta(days=7)
     df['Start Time:'] = pd.to_datetime(df['Start Time:'], format='mixed', dayfirst=False)
     inbound_df = df[(df['Media Type'] != 'Email') & (df['Outbound'] == 0)][['ANI/From']]
-    outbound_df = df[(df['Media Type'] != 'Email') & (df['Outbound'] == 1) & (df['Start Time:'] >= fourteen_days_ago)][['ANI/From']]
-    outbound_seven_df = df[(df['Media Type'] != 'Email') & (df['Outbound'] == 1) & (df['Start Time:'] >= seven_days_ago)][['ANI/From']]
+    outbound_df = df[(df['Media Type'] != 'Email') & (df['Outbound'] == 1)]
 
     inbound_df.drop_duplicates(inplace=True)
-    outbound_df.drop_duplicates(inplace=True)
-    outbound_seven_df.drop_duplicates(inplace=True)
 
     # get_update_df(inbound_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
-    global mvp_df
     inbound_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, inbound_df], ignore_index=True)
-    inbound_df = None
     # get_update_df(outbound_df, 'CallOut-14d+TextOut-30d')
-    outbound_df_list.append(outbound_df.values.tolist())
-    outbound_df = None
-
-    outbound_seven_days_list.append(outbound_seven_df.values.tolist())
-    outbound_seven_df = None
+    return SourceContribution({MVP_SHEET: inbound_df}, outbound_events(outbound_df['ANI/From'], outbound_df['Start Time:'], 14))
 
-def add_mvp_calls_inbound(df: pd.DataFrame, dbx):
+def add_mvp_calls_inbound(df: pd.DataFrame) -> SourceContribution:
     print("Processing MVP Calls")
     inbound_df = df[df['Call Direction'] == 'Inbound'][['From Number']]
     outbound_df = df[df['Call Direction'] == 'Outbound'][['From Number']]
@@ -431,20 +332,12 @@ def add_mvp_calls_inbound(df: pd.DataFrame, dbx):
     outbound_df.drop_duplicates(inplace=True)
 
     # get_update_df(inbound_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
-    global mvp_df
     inbound_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, inbound_df], ignore_index=True)
-    inbound_df = None
     # get_update_df(outbound_df, 'CallOut-14d+TextOut-30d')
-    outbound_df_list.append(outbound_df.values.tolist())
-    outbound_df = None
+    return SourceContribution({MVP_SHEET: inbound_df}, outbound_events(outbound_df['From Number']))
 
-def add_mvp(df: pd.DataFrame, dbx):
+def add_mvp(df: pd.DataFrame) -> SourceContribution:
     print("Processing MVP Texts")
-    # Calculate the date threshold
-    thirty_days_ago = pd.Timestamp.utcnow() - timedelta(days=30)
-    seven_days_ago = pd.Timestamp.utcnow() - timedelta(days=7)
-
     # Convert 'Date / Time' to datetime efficiently
     df['Date / Time'] = pd.to_datetime(df['Date / Time'], utc=True, errors='coerce')
 
@@ -463,40 +356,22 @@ def add_mvp(df: pd.DataFrame, dbx):
 
     outbound_df = df.loc[
         (df['Direction'] == 'Outbound') & 
-        (df['Date / Time'] >= thirty_days_ago) & 
-        (df['Sender Number'].str.len() == 10),
-        ['Sender Number']
-    ].drop_duplicates()
-
-    outbound_seven_df = df.loc[
-        (df['Direction'] == 'Outbound') & 
-        (df['Date / Time'] >= seven_days_ago) & 
         (df['Sender Number'].str.len() == 10),
-        ['Sender Number']
-    ].drop_duplicates()
+        ['Sender Number', 'Date / Time']
+    ]
 
     # get_update_df(inbound_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
-    global mvp_df
     inbound_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, inbound_df], ignore_index=True)
-    inbound_df = None
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
     #     final_df.to_excel(writer, sheet_name='MVPLogs', index=False, header=False)
 
-    outbound_df_list.append(outbound_df.values.tolist())
-    outbound_df = None
-
-    outbound_seven_days_list.append(outbound_seven_df.values.tolist())
-    outbound_seven_df = None
+    return SourceContribution({MVP_SHEET: inbound_df}, outbound_events(outbound_df['Sender Number'], outbound_df['Date / Time'], 30))
 
-def add_rc(df: pd.DataFrame, dbx):
+def add_rc(df: pd.DataFrame) -> SourceContribution:
     print("Processing RC")
-    thirty_days_ago = pd.to_datetime('today', utc=True, format='mixed', dayfirst=False) - timedelta(days=30)
-    seven_days_ago = pd.to_datetime('today', utc=True, format='mixed', dayfirst=False) - timedelta(days=7)
     df['Creation Time (UTC)'] = pd.to_datetime(df['Creation Time (UTC)'], utc=True, format='mixed', dayfirst=False)
     received_df = df[df['Direction'] == 'Inbound'][['From']]
-    sent_df = df[(df['Direction'] == 'Outbound') & (df['Creation Time (UTC)'] >= thirty_days_ago)][['To']]
-    sent_seven_df = df[(df['Direction'] == 'Outbound') & (df['Creation Time (UTC)'] >= seven_days_ago)][['To']]
+    sent_df = df[df['Direction'] == 'Outbound'][['To', 'Creation Time (UTC)']]
     received_df['From'] = received_df['From'].apply(
         lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else x
     ).str[1:]
@@ -505,20 +380,11 @@ def add_rc(df: pd.DataFrame, dbx):
         lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else x
     ).str[1:]
 
-    sent_seven_df['To'] = sent_seven_df['To'].apply(
-        lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else x
-    ).str[1:]
-
 
     received_df.drop_duplicates(subset=['From'], inplace=True)
-    sent_df.drop_duplicates(subset=['To'], inplace=True)
-    sent_seven_df.drop_duplicates(subset=['To'], inplace=True)
 
     # get_update_df(received_df, 'CCM+CH+MVPC+MVPT+JC+RC+PD')
-    global mvp_df
     received_df.columns = [0]
-    mvp_df = pd.concat([mvp_df, received_df], ignore_index=True)
-    received_df = None
     # get_update_df(sent_df, 'RCSMS-Sent')
 
     # with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
@@ -527,228 +393,111 @@ def add_rc(df: pd.DataFrame, dbx):
     # with pd.ExcelWriter('./data/List Cleaner.xlsx', engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
     #     sent_df.to_excel(writer, sheet_name='RCSMS-Sent', index=False, header=False)
 
-    outbound_df_list.append(sent_df.values.tolist())
-    sent_df = None
+    return SourceContribution({MVP_SHEET: received_df}, outbound_events(sent_df['To'], sent_df['Creation Time (UTC)'], 30))
 
-    outbound_seven_days_list.append(sent_seven_df.values.tolist())
-    sent_seven_df = None
-
-def add_c3(df: pd.DataFrame, dbx):
+def add_c3(df: pd.DataFrame) -> SourceContribution:
     print("Processing C3")
-    global dnc_df
     df['Contact Information'] = df['Contact Information'].astype(str)
     df['Contact Information'] = df['Contact Information'].str.replace(r'\D', '', regex=True)
     output_df = df[df['Contact Information'].str.len() == 10][['Contact Information']].drop_duplicates(subset=['Contact Information'])
     # get_update_df(output_df, 'DNC')
     output_df.columns = [0]
-    dnc_df = pd.concat([dnc_df, output_df], ignore_index=True)
-    output_df = None
-
-def get_latest_file(folder_path, dbx):
-    try:
-        # List files in the folder
-        response = dbx.files_list_folder(folder_path)
-
-        latest_file = None
-        latest_timestamp = None
-
-        for entry in response.entries:
-            if isinstance(entry, dropbox.files.FileMetadata):
-                # Compare the 'client_modified' timestamp to find the latest file
-                if latest_timestamp is None or entry.client_modified > latest_timestamp:
-                    latest_file = entry
-                    latest_timestamp = entry.client_modified
-
-        return latest_file.path_lower if latest_file else None
-
-    except Exception as e:
-        print(f"Error getting latest file from {folder_path}: {e}")
-        return None
-
-def load_sheets(root_path, dbx, conversion_dict):
-    try:
-        # List files and folders in the current path
-        response = dbx.files_list_folder(root_path)
-        for entry in response.entries:
-            if isinstance(entry, dropbox.files.FileMetadata):
-                file_path = entry.path_lower
-                folder_path = "/".join(file_path.split('/')[:-1])
-                folder_name = file_path.split('/')[:-1][-1]
-
-                # Check if valid folder name then get corresponding function per folder
-                if folder_name in conversion_dict:
-                    file_type_function = conversion_dict[folder_name]
-
-                    # Process the latest only
-                    if file_path == get_latest_file(folder_path, dbx):
-                        file_type_function(file_path, dbx)
-                        
-            elif isinstance(entry, dropbox.files.FolderMetadata):
-                load_sheets(entry.path_lower, dbx, conversion_dict)
-
-        # Handle pagination
-        while response.has_more:
-            response = dbx.files_list_folder_continue(response.cursor)
-            for entry in response.entries:
-                if isinstance(entry, dropbox.files.FileMetadata):
-                    file_path = entry.path_lower
-                    folder_path = "/".join(file_path.split('/')[:-1])
-                    folder_name = file_path.split('/')[:-1][-1]
-
-                    # Check if valid folder name then get corresponding function per folder
-                    if folder_name in conversion_dict:
-                        file_type_function = conversion_dict[folder_name]
-
-                        # Process the latest only
-                        if file_path == get_latest_file(folder_path, dbx):
-                            file_type_function(file_path, dbx)
-                            
-                elif isinstance(entry, dropbox.files.FolderMetadata):
-                    load_sheets(entry.path_lower, dbx, conversion_dict)
-
-    except dropbox.exceptions.ApiError as e:
-        print(f"Error accessing path '{root_path}': {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-
-def concat_contact_center_files(path: str, dbx):
-
-    result = dbx.files_list_folder(path)
-    contact_center_files = result.entries
-    df_list = []
-
-    for file in contact_center_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            df = read_dropbox_file(file_path, dbx)
-            df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
-    
-def concat_inbound_contact_history(path: str, dbx: dropbox.Dropbox):
-
-    result = dbx.files_list_folder(path)
-    inbound_contact_history_files = result.entries
-    df_list = []
-
-    for file in inbound_contact_history_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            df = read_dropbox_file(file_path, dbx)
-            df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
-
-    
-def concat_rc_files(path: str, dbx):
-
-    result = dbx.files_list_folder(path)
-    rc_files = result.entries
-    df_list = []
-
-    for file in rc_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            df = read_dropbox_file(file_path, dbx)
-            df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
-
-def concat_mvp_files(path: str, dbx):
+    return SourceContribution({DNC_SHEET: output_df})
+
+def list_folder(dbx: dropbox.Dropbox, path: str, recursive: bool = False) -> list:
+
+    # Every entry of the folder, following the listing cursor through all of its pages
+    response = dbx.files_list_folder(path, recursive=recursive)
+    entries = list(response.entries)
+    while response.has_more:
+        response = dbx.files_list_folder_continue(response.cursor)
+        entries.extend(response.entries)
+
+    return entries
+
+def index_latest_files(entries: list) -> dict:
+
+    # Latest file of every folder by 'client_modified', the first one listed wins a tie
+    latest_files = {}
+    for entry in entries:
+        if isinstance(entry, dropbox.files.FileMetadata):
+            folder_path = entry.path_lower.rsplit('/', 1)[0]
+            latest_file = latest_files.get(folder_path)
+            if latest_file is None or entry.client_modified > latest_file.client_modified:
+                latest_files[folder_path] = entry
+
+    return latest_files
+
+def load_sheets(executor: concurrent.futures.Executor, root_path, dbx, conversion_dict, manifest: SourceManifest) -> list:
+
+    # One recursive listing of the whole tree instead of listing each folder once per file
+    latest_files = index_latest_files(list_folder(dbx, root_path, recursive=True))
+
+    # Check if valid folder name then process its latest file only
+    futures = []
+    for folder_path, latest_file in latest_files.items():
+        folder_name = folder_path.split('/')[-1]
+        if folder_name in conversion_dict:
+            read, file_type_function = conversion_dict[folder_name]
+            futures.append(submit_contribution(executor, manifest, latest_file, dbx, read, file_type_function))
+
+    return futures
+
+def read_with_retry(read, path: str, dbx: dropbox.Dropbox):
+
+    # Transient Dropbox and network errors are retried with a growing delay
+    for attempt in range(DOWNLOAD_RETRIES):
+        try:
+            return read(path, dbx)
+        except RETRYABLE_ERRORS as e:
+            if attempt == DOWNLOAD_RETRIES - 1:
+                raise
+            print(f"Retrying download of {path}: {e}")
+            time.sleep(2 ** attempt)
+
+def submit_contribution(executor: concurrent.futures.Executor, manifest: SourceManifest, entry, dbx: dropbox.Dropbox,
+                        read, contribute) -> concurrent.futures.Future:
+    return executor.submit(manifest.contribution, entry, dbx, partial(read_with_retry, read), contribute)
+
+def load_folder(executor: concurrent.futures.Executor, path: str, dbx: dropbox.Dropbox, manifest: SourceManifest,
+                contribute, read=read_dropbox_file, file_filter=None) -> list:
+
+    # Only new or changed files are downloaded, and each one is parsed as soon as it arrives.
+    # The futures are returned in listing order.
+    files = [
+        entry for entry in list_folder(dbx, path)
+        if isinstance(entry, dropbox.files.FileMetadata) and (file_filter is None or file_filter(entry.path_lower))
+    ]
 
-    result = dbx.files_list_folder(path)
-    mvp_files = result.entries
-    df_list = []
+    return [submit_contribution(executor, manifest, file, dbx, read, contribute) for file in files]
 
-    for file in mvp_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            df = read_dropbox_file(file_path, dbx)
-            df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
-    
-def concat_inbound_mvp_calls(path: str, dbx: dropbox.Dropbox):
-
-    result = dbx.files_list_folder(path)
-    inbound_mvp_call_files = result.entries
-    df_list = []
-
-    for file in inbound_mvp_call_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            if file_path.endswith('.xlsx'):
-                metadata, response = dbx.files_download(file_path)
-                df = pd.read_excel(BytesIO(response.content), sheet_name='Calls')
-                df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
+def read_mvp_calls_file(path: str, dbx: dropbox.Dropbox) -> pd.DataFrame:
+    metadata, response = dbx.files_download(path)
+    return pd.read_excel(BytesIO(response.content), sheet_name='Calls')
 
-def concat_c3(path: str, dbx):
+def is_xlsx_file(path: str) -> bool:
+    return path.endswith('.xlsx')
 
-    result = dbx.files_list_folder(path)
-    mvp_files = result.entries
-    df_list = []
+def create_local_list_cleaner(auth_code: str, local_data_path: str) -> 'tuple[dict, dict]':
 
-    for file in mvp_files:
-        if isinstance(file, dropbox.files.FileMetadata):
-            file_path = file.path_lower
-            df = read_dropbox_file(file_path, dbx)
-            df_list.append(df)
-    
-    if df_list:
-        combined_df = pd.concat(df_list)
-        return combined_df
+    print("Creating new local list cleaner file")
 
-def create_local_list_cleaner(local_data_path: str, root_path: str, dbx: dropbox.Dropbox) -> None:
-    global dnc_df, mvp_df, db_id_df, time_df, conv_df, pd_jr_aa_df
+    # Only the sheets that changed on Dropbox since they were last downloaded or uploaded are downloaded
+    content_hashes = download_list_cleaner(auth_code, local_data_path, BASE_SHEETS)
 
-    print("Creating new local list cleaner file")
+    sheets = {
+        sheet_name: pd.read_csv(f"{local_data_path}/{sheet_name}.csv", low_memory=False, header=None)
+        for sheet_name in BASE_SHEETS
+    }
 
-    sheet_names = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)",
-        "DNC (Cold-PD)",
-        "UniqueDB ID (Cold)",
-        "CallOut-14d+TextOut-30d (Cold)",
-        "PDConvDup (PD)",
-        "PDJRAADups (PD)"
-    ]
+    return sheets, content_hashes
 
-    for sheet_name in sheet_names:
-        dropbox_path = f"{root_path}/{sheet_name}.csv"
-        local_file_path = f"{local_data_path}/{sheet_name}.csv"
-        metadata, response = dbx.files_download(dropbox_path)
-
-        with open(local_file_path, 'wb') as f:
-            f.write(response.content)
-
-        df = pd.read_csv(local_file_path, low_memory=False, header=None)
-
-        match sheet_name:
-            case "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)":
-                mvp_df = df
-            case "DNC (Cold-PD)":
-                dnc_df = df
-            case "UniqueDB ID (Cold)":
-                db_id_df = df
-            case "CallOut-14d+TextOut-30d (Cold)":
-                time_df = df
-            case "PDConvDup (PD)":
-                conv_df = df
-            case "PDJRAADups (PD)":
-                pd_jr_aa_df = df
-            case _:
-                print(f"Unknown sheet: {sheet_name}")
+def merge_contribution(sheets: dict, contribution: SourceContribution) -> None:
+    for sheet_name, df in contribution.sheets.items():
+        if sheet_name in REPLACED_SHEETS:
+            sheets[sheet_name] = df
+        else:
+            sheets[sheet_name] = pd.concat([sheets[sheet_name], df], ignore_index=True)
 
 def check_user_folder_paths(dbx: dropbox.Dropbox):
     result = dbx.files_list_folder(path="", recursive=True)
@@ -781,63 +530,78 @@ def main(auth_code: str, app_window: ctk.CTkFrame):
         dbx = dropbox.Dropbox(auth_code)
 
         root_path = check_user_folder_paths(dbx)
-        global outbound_df_list, outbound_seven_days_list
-        outbound_df_list = []
-        outbound_seven_days_list = []
         
         # Create constant variables
         local_data_path = './data'
         conversion_dict = {
-            "jc": add_jc,
-            "pd_db": add_unique_db,
-            "pd_phone": add_pd_phones,
-            "pd_remove": add_remove_list,
-            "pd_convdups": add_pd_conv_dup,
-            "sly": add_sly,
-            "pd_jr_aa": add_pd_jr_aa_dup
+            "jc": (read_jc_file, add_jc),
+            "pd_db": (read_dropbox_file, add_unique_db),
+            "pd_phone": (read_dropbox_file, add_pd_phones),
+            "pd_remove": (read_dropbox_file, add_remove_list),
+            "pd_convdups": (read_dropbox_file, add_pd_conv_dup),
+            "sly": (read_dropbox_file, add_sly),
+            "pd_jr_aa": (read_dropbox_file, add_pd_jr_aa_dup)
         }
 
-        # Download and replace local list cleaner file
-        create_local_list_cleaner(local_data_path, root_path, dbx)
-
-        # Update the list cleaner file
-        load_sheets(root_path, dbx, conversion_dict)
-
-        # Process c3 folder files
-        c3_df = concat_c3(f'{root_path}/c3', dbx)
-        add_c3(c3_df, dbx)
-
-        # Process contact_center folder files
-        contact_center_df = concat_contact_center_files(f'{root_path}/contact_center', dbx)
-        add_contact_center(contact_center_df, dbx)
-
-        # Process contact_history folder files
-        contact_history_df = concat_inbound_contact_history(f'{root_path}/contact_history', dbx)
-        add_contact_history_inbound(contact_history_df, dbx)
-
-        # Process rc folder files
-        rc_df = concat_rc_files(f'{root_path}/rc', dbx)
-        add_rc(rc_df, dbx)
-
-        # Process mvp folder files
-        mvp_df = concat_mvp_files(f'{root_path}/mvp', dbx)
-        add_mvp(mvp_df, dbx)
-
-        # Process mvp_calls folder files
-        mvp_calls_df = concat_inbound_mvp_calls(f'{root_path}/mvp_calls', dbx)
-        add_mvp_calls_inbound(mvp_calls_df, dbx)
+        # Exports already processed by the last upload are not downloaded again
+        manifest = SourceManifest()
+
+        # Every export is downloaded on one bounded pool in the background while the list cleaner
+        # is updated, then processed in order. A failed export stops the run before the manifest
+        # is saved, so its recorded contribution is kept for the next run.
+        folder_loaders = [
+            ('c3', add_c3, read_dropbox_file, None),
+            ('contact_center', add_contact_center, read_dropbox_file, None),
+            ('contact_history', add_contact_history_inbound, read_dropbox_file, None),
+            ('rc', add_rc, read_dropbox_file, None),
+            ('mvp', add_mvp, read_dropbox_file, None),
+            ('mvp_calls', add_mvp_calls_inbound, read_mvp_calls_file, is_xlsx_file)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_DOWNLOADS) as executor:
+            sheet_futures = load_sheets(executor, root_path, dbx, conversion_dict, manifest)
+            folder_futures = [
+                (folder, load_folder(executor, f'{root_path}/{folder}', dbx, manifest, add_folder, read, file_filter))
+                for folder, add_folder, read, file_filter in folder_loaders
+            ]
+
+            # Download the list cleaner sheets that changed since the last run
+            sheets, content_hashes = create_local_list_cleaner(auth_code, local_data_path)
+
+            # Update the list cleaner file
+            contributions = [future.result() for future in sheet_futures]
+
+            for folder, futures in folder_futures:
+
+                # Folders without files have nothing to add
+                if not futures:
+                    print(f"No files found in {folder}")
+
+                contributions.extend(future.result() for future in futures)
+
+        # Unchanged exports are already in the sheets this tool uploaded last time, so only the
+        # new ones are added unless the sheets were replaced on Dropbox since then
+        base_is_current = manifest.base_is_current(content_hashes, [f"{sheet_name}.csv" for sheet_name in BASE_SHEETS])
+        new_exports = sum(is_new for _, is_new in contributions)
+        print(f"{new_exports} new or changed export(s), {len(contributions) - new_exports} unchanged")
+
+        for contribution, is_new in contributions:
+            if is_new or not base_is_current:
+                merge_contribution(sheets, contribution)
 
         # # Save all new sheets locally
         # append_to_multiple_sheets(local_list_cleaner_path)
 
-        # Create and replace the outbound sheet
-        save_all_files()
+        # Create and replace the outbound sheet from the contacts of every export still in the folders
+        save_all_files(local_data_path, sheets, [contribution for contribution, _ in contributions])
 
         # # Drop all duplicates of list cleaner file
         # drop_list_cleaner_dupes(local_list_cleaner_path)
 
         # Upload to dropbox
-        export_to_dropbox(root_path, local_data_path, dbx)
+        uploaded = export_to_dropbox(root_path, local_data_path, dbx)
+
+        # The exports are only recorded once the sheets holding their rows are uploaded
+        manifest.save(uploaded)
 
         # Update label
         update_latest_cleaner_file_label(app_window, dbx)
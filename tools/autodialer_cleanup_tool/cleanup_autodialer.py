@@ -1,52 +1,87 @@
 import os
 import re
+import concurrent.futures
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import warnings
 import dropbox
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from urllib.parse import quote
+from contextlib import closing
+from tools.autodialer_cleanup_tool.disposition_cache import (
+    DISPOSITIONS, RECENT_DISPOSITIONS, open_disposition_cache, update_disposition_cache, read_disposition_sets, recent_window_start,
+    sql_list, to_phone_set
+)
+from tools.autodialer_cleanup_tool.output_writer import write_output
+from tools.autodialer_cleanup_tool.workbook_cache import read_xlsb_sheet
+from tools.phone_cleanup_tool.list_cleaner import PhoneSourceIndex, SuppressionCatalog, SuppressionIndex, download_list_cleaner
 
 warnings.simplefilter(action='ignore', category=pd.errors.SettingWithCopyWarning)
 
-disposition_query = """
-SELECT
-	dnis_to
+# List cleaner, database and next input file
+PREFETCH_WORKERS = 3
+
+# Roman numerals such as the III in "John Smith III" stay upper case
+ROMAN_NUMERAL_PATTERN = re.compile(r'(?i)(i{1,3}|iv|v?i{0,3}|ix|x{1,3}|xl|l{1,3}|xc|c{1,3}|cd|d{1,3}|cm|m{1,4})')
+NAME_CACHE_SIZE = 2 ** 16
+
+# Bits of the sources a phone number can be removed for
+LIST_CLEANER_SOURCE = 1
+DISPOSITION_SOURCE = 2
+SIX_MONTHS_SOURCE = 4
+SOURCE_NAMES = {
+    LIST_CLEANER_SOURCE: 'List Cleaner',
+    DISPOSITION_SOURCE: 'Disposition',
+    SIX_MONTHS_SOURCE: 'Disposition - last 6 months'
+}
+
+# List cleaner sheets the phone numbers are searched in
+CLEANING_FILES = [
+    "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold).csv",
+    "DNC (Cold-PD).csv",
+    "CallOut-14d+TextOut-30d (Cold).csv",
+    "CallTextOut-7d (PD).csv",
+    "PDConvDup (PD).csv",
+    "PDJRAADups (PD).csv"
+]
+RECLEANING_FILES = [
+    "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold).csv",
+    "DNC (Cold-PD).csv",
+    "PDConvDup (PD).csv",
+    "PDJRAADups (PD).csv"
+]
+ID_FILE = "UniqueDB ID (Cold).csv"
+
+# The candidates are numbers, so MySQL compares dnis_to with them as a number. That matches
+# the pd.to_numeric normalization of the cached mode ('5550000001.0' and ' 5550000001' match)
+# at the cost of not using an index on dnis_to.
+candidate_phones_query = """
+CREATE TEMPORARY TABLE candidate_phones (
+    phone BIGINT NOT NULL PRIMARY KEY
+)
+"""
+
+disposition_join_query = """
+SELECT DISTINCT
+    candidate_phones.phone AS dnis_to
 FROM
-	max_outbound_calls
+    candidate_phones
+    JOIN max_outbound_calls ON max_outbound_calls.dnis_to = candidate_phones.phone
 WHERE
-	primary_disposition IS NOT NULL AND
-    primary_disposition IN 
-	(
-		'Business/ Work number',
-		'Sold Interests',
-		'Incorrect contact / Wrong number',
-		'Do Not Call Again (remove from list)',
-		'Invalid Number',
-		'Proactive Identified - Answering Machine Left Message',
-		'Answering Machine Left Message'
-	)
-GROUP BY
-	dnis_to
+    max_outbound_calls.primary_disposition IN ({dispositions})
 """
 
-six_months_query = """
-WITH ranked_calls AS (
-    SELECT
-        dnis_to,
-        ROW_NUMBER() OVER (PARTITION BY dnis_to ORDER BY start_time DESC) AS date_rank
-    FROM
-        max_outbound_calls
-    WHERE
-        primary_disposition IN ('Lead Not interested', 'Uncooperative Lead')
-        AND start_time BETWEEN DATE_ADD(CURRENT_DATE, INTERVAL -6 MONTH) AND CURRENT_DATE
-)
-SELECT
-    dnis_to
+six_months_join_query = """
+SELECT DISTINCT
+    candidate_phones.phone AS dnis_to
 FROM
-    ranked_calls
+    candidate_phones
+    JOIN max_outbound_calls ON max_outbound_calls.dnis_to = candidate_phones.phone
 WHERE
-    date_rank = 1;
+    max_outbound_calls.primary_disposition IN ({dispositions})
+    AND max_outbound_calls.start_time >= :window_start
 """
 
 def extract_list_cleaner_file(auth_code: str, local_path: str, dropbox_path: str):
@@ -55,52 +90,26 @@ def extract_list_cleaner_file(auth_code: str, local_path: str, dropbox_path: str
     with open(local_path, 'wb') as f:
         f.write(response.content)
 
-def download_list_cleaner(auth_code: str) -> None:
-    global dnc_df, mvp_df, db_id_df, time_df, conv_df
-
-    print("Downloading list cleaner files")
-
-    sheet_names = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)",
-        "DNC (Cold-PD)",
-        "UniqueDB ID (Cold)",
-        "CallOut-14d+TextOut-30d (Cold)",
-        "CallTextOut-7d (PD)",
-        "PDConvDup (PD)",
-        "PDJRAADups (PD)"
-    ]
-
-    for sheet_name in sheet_names:
-        dropbox_path = f"/List Cleaner & JC DNC/{sheet_name}.csv"
-        local_file_path = f"./data/{sheet_name}.csv"
-        dbx = dropbox.Dropbox(auth_code)
-        metadata, response = dbx.files_download(dropbox_path)
-
-        with open(local_file_path, 'wb') as f:
-            f.write(response.content)
+def create_cm_engine():
+    host = os.getenv('DB_HOST')
+    user = os.getenv('DB_USER')
+    name = os.getenv('DB_NAME')
+    password = os.getenv('DB_PASSWORD')
+    return create_engine(f'mysql+pymysql://{user}:{quote(password)}@{host}/{name}')
 
 def read_cm_live_db() -> 'tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame | None]':
 
     try:
         # Create database engine
-        host = os.getenv('DB_HOST')
-        user = os.getenv('DB_USER')
-        name = os.getenv('DB_NAME')
-        password = os.getenv('DB_PASSWORD')
-        engine = create_engine(f'mysql+pymysql://{user}:{quote(password)}@{host}/{name}')
+        engine = create_cm_engine()
 
         print(f'Reading Community Minerals Database')
 
-        disposition_df = pd.read_sql_query(disposition_query, engine)
-        six_months_df = pd.read_sql_query(six_months_query, engine)
-
-        disposition_df['dnis_to'] = pd.to_numeric(disposition_df['dnis_to'], errors='coerce')
-        disposition_df['dnis_to'] = disposition_df['dnis_to'].astype('Int64')
-        disposition_set = set(disposition_df.loc[disposition_df['dnis_to'].notna(), 'dnis_to'].map(int))
-
-        six_months_df['dnis_to'] = pd.to_numeric(six_months_df['dnis_to'], errors='coerce')
-        six_months_df['dnis_to'] = six_months_df['dnis_to'].astype('Int64')
-        months_set = set(six_months_df.loc[six_months_df['dnis_to'].notna(), 'dnis_to'].map(int))
+        # Only calls made since the last run are read, the sets are rebuilt from the local cache
+        with closing(open_disposition_cache()) as cache:
+            new_rows = update_disposition_cache(cache, engine)
+            print(f'Cached {new_rows} new disposition(s)')
+            disposition_set, months_set = read_disposition_sets(cache)
 
         return disposition_set, months_set
 
@@ -110,42 +119,68 @@ def read_cm_live_db() -> 'tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.Dat
     finally:
         engine.dispose()
 
+def read_matching_dispositions(engine, phones_df: pd.DataFrame) -> 'tuple[set, set]':
 
-def export_output(df: pd.DataFrame, file_path: str, save_path: str) -> None:
+    # Only the numbers of this list are sent to the database and joined against the call table there
+    candidates = pd.concat([phones_df[column] for column in phones_df.columns]).dropna().unique()
+    if not len(candidates):
+        return set(), set()
 
-    # Capitalization of all names
-    columns_to_transform = ['Owner','Combined Name', 'First Name', 'Middle Name', 'Last Name']
-    df[columns_to_transform] = df[columns_to_transform].applymap(lambda x: x.title() if isinstance(x, str) else x)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text(candidate_phones_query))
+
+            # The table lives as long as the pooled connection, so it is dropped even when a query fails
+            try:
+                connection.execute(text("INSERT IGNORE INTO candidate_phones (phone) VALUES (:phone)"),
+                                   [{'phone': int(phone)} for phone in candidates])
+
+                disposition_df = pd.read_sql_query(text(disposition_join_query.format(dispositions=sql_list(DISPOSITIONS))), connection)
+                six_months_df = pd.read_sql_query(text(six_months_join_query.format(dispositions=sql_list(RECENT_DISPOSITIONS))), connection,
+                                                 params={'window_start': recent_window_start()})
+            finally:
+                connection.execute(text("DROP TEMPORARY TABLE IF EXISTS candidate_phones"))
+
+        return to_phone_set(disposition_df['dnis_to']), to_phone_set(six_months_df['dnis_to'])
+
+    except Exception as e:
+        raise RuntimeError(f"An error occurred while reading from the database: {e}")
+
+
+def output_path(prefix: str, file_path: str, save_path: str) -> 'str | None':
 
     filename = os.path.basename(file_path)
-    if filename.endswith('.csv'):
-        df.to_csv(f"{save_path}/(Clean file) {filename}", index=False)
-    
-    elif filename.endswith('.xlsx'):
-        df.to_excel(f"{save_path}/(Clean file) {filename}", index=False)
+    if filename.endswith('.csv') or filename.endswith('.xlsx'):
+        return f"{save_path}/({prefix}) {filename}"
 
     elif filename.endswith('.xlsb'):
-        df.to_excel(f"{save_path}/(Clean file) {filename.split('.')[0]}.xlsx", index=False)
-    
+        return f"{save_path}/({prefix}) {filename.split('.')[0]}.xlsx"
+
+    return None
+
+def export_output(df: pd.DataFrame, file_path: str, save_path: str,
+                  shard_rows: int = None, shard_column: str = None) -> None:
+
+    # Capitalization of all names
+    columns_to_transform = ['Owner','Combined Name', 'First Name', 'Middle Name', 'Last Name']
+    df[columns_to_transform] = df[columns_to_transform].apply(case_names)
+
+    path = output_path('Clean file', file_path, save_path)
+    if path:
+        write_output(df, path, shard_rows, shard_column)
     else:
         print("No output generated. Invalid file format")
 
-def export_reclean_output(df: pd.DataFrame, file_path: str, save_path: str) -> None:
+def export_reclean_output(df: pd.DataFrame, file_path: str, save_path: str,
+                          shard_rows: int = None, shard_column: str = None) -> None:
 
     # Capitalization of all names
     columns_to_transform = ['Owner', 'First Name']
-    df[columns_to_transform] = df[columns_to_transform].applymap(lambda x: x.title() if isinstance(x, str) else x)
+    df[columns_to_transform] = df[columns_to_transform].apply(case_names)
 
-    filename = os.path.basename(file_path)
-    if filename.endswith('.csv'):
-        df.to_csv(f"{save_path}/(Re-clean file) {filename}", index=False)
-    
-    elif filename.endswith('.xlsx'):
-        df.to_excel(f"{save_path}/(Re-clean file) {filename}", index=False)
-
-    elif filename.endswith('.xlsb'):
-        df.to_excel(f"{save_path}/(Re-clean file) {filename.split('.')[0]}.xlsx", index=False)
-    
+    path = output_path('Re-clean file', file_path, save_path)
+    if path:
+        write_output(df, path, shard_rows, shard_column)
     else:
         print("No output generated. Invalid file format")
 
@@ -158,50 +193,56 @@ def read_file(path: str):
         return pd.read_excel(path)
     
     elif path.endswith('.xlsb'):
-        return pd.read_excel(path, engine='pyxlsb', sheet_name=['List'])['List']
+        return read_xlsb_sheet(path, 'List')
     
     else:
         raise ValueError("Invalid file format: Please provide a .csv, .xlsx or .xlsb file.")
     
-def is_valid_phone(phone):
-    return bool(re.fullmatch(r'\d{10,15}', phone))
-
-def remove_phone_dupes(df: pd.DataFrame) -> pd.DataFrame:
-
-    df['original_index'] = df.index
-    phone_columns = ['phone1', 'phone2', 'phone3', 'phone4', 'phone5']
-    sorted_df = df.sort_values(by=phone_columns, ascending=False)
-
-    for phone in phone_columns:
-        sorted_df.loc[(sorted_df[phone].notna()) & (sorted_df[phone].duplicated(keep='last')), phone] = pd.NA
-    
-    phone_filter_mask = (sorted_df['phone5'].isin(sorted_df['phone2'])) \
-    | (sorted_df['phone5'].isin(sorted_df['phone3'])) \
-    | (sorted_df['phone5'].isin(sorted_df['phone4'])) \
-    | (sorted_df['phone5'].isin(sorted_df['phone1']))
-    sorted_df.loc[(sorted_df['phone5'].notna()) & (phone_filter_mask), 'phone5'] = pd.NA
-
-    phone_filter_mask = (sorted_df['phone4'].isin(sorted_df['phone3'])) \
-    | (sorted_df['phone4'].isin(sorted_df['phone2'])) \
-    | (sorted_df['phone4'].isin(sorted_df['phone1']))
-    sorted_df.loc[(sorted_df['phone4'].notna()) & (phone_filter_mask), 'phone4'] = pd.NA
-
-    phone_filter_mask = (sorted_df['phone3'].isin(sorted_df['phone2'])) \
-    | (sorted_df['phone3'].isin(sorted_df['phone1']))
-    sorted_df.loc[(sorted_df['phone3'].notna()) & (phone_filter_mask), 'phone3'] = pd.NA
-
-    phone_filter_mask = (sorted_df['phone2'].isin(sorted_df['phone1']))
-    sorted_df.loc[(sorted_df['phone2'].notna()) & (phone_filter_mask), 'phone2'] = pd.NA
-            
-    sorted_df = sorted_df.sort_values(by='original_index')
-    sorted_df = sorted_df.drop(columns='original_index')
-    return sorted_df
-
-def clean_contact_id_deal_id(df: pd.DataFrame, id_set: set) -> pd.DataFrame:
+def remove_phone_dupes(df: pd.DataFrame, phone_columns: list = None) -> pd.DataFrame:
+
+    phone_columns = phone_columns or ['phone1', 'phone2', 'phone3', 'phone4', 'phone5']
+    row_count = len(df)
+
+    # Long form (slot, row, phone) of the filled phone cells, with the phones factorized
+    # in ascending order so the codes sort like the phones
+    codes, _ = pd.factorize(pd.concat([df[phone] for phone in phone_columns], ignore_index=True), sort=True)
+    cells = np.flatnonzero(codes >= 0)
+    slots, rows = np.divmod(cells, row_count)
+    phones = codes[cells]
+
+    # Position of every row when the list is sorted by the phone columns descending,
+    # blanks last and ties in list order. Columns are packed into as few int64 keys as fit.
+    base = codes.max(initial=0) + 2
+    descending = np.where(codes >= 0, base - 2 - codes, base - 1).reshape(len(phone_columns), row_count)
+    columns_per_key = max(1, int(62 // np.log2(base)))
+    sort_keys = []
+    for start in range(0, len(phone_columns), columns_per_key):
+        sort_key = np.zeros(row_count, dtype=np.int64)
+        for column_key in descending[start:start + columns_per_key]:
+            sort_key = sort_key * base + column_key
+        sort_keys.append(sort_key)
+
+    rank = np.empty(row_count, dtype=np.int64)
+    rank[np.lexsort(sort_keys[::-1])] = np.arange(row_count)
+
+    # Every phone is kept once: in the lowest slot it appears in and, within that slot,
+    # on the row that comes last in the sorted order
+    order = np.argsort((phones * len(phone_columns) + slots) * row_count + (row_count - 1 - rank[rows]))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = phones[order[1:]] != phones[order[:-1]]
+
+    keep = np.zeros((row_count, len(phone_columns)), dtype=bool)
+    keep[rows[order[first]], slots[order[first]]] = True
+
+    deduped_df = df.copy()
+    deduped_df[phone_columns] = deduped_df[phone_columns].where(keep)
+    return deduped_df
+
+def clean_contact_id_deal_id(df: pd.DataFrame, id_set: SuppressionIndex) -> pd.DataFrame:
 
     if 'contact_id' in df.columns:
         df['contact_id'] = df['contact_id'].apply(pd.to_numeric, errors='coerce').astype('Int64')
-        df = df[~df['contact_id'].isin(id_set)]
+        df = df[~id_set.contains(df['contact_id'])]
     
     if 'Deal ID' in df.columns:
         df = df[df['Deal ID'].isna()]
@@ -210,60 +251,36 @@ def clean_contact_id_deal_id(df: pd.DataFrame, id_set: set) -> pd.DataFrame:
 
     return final_df
 
-def get_phone_set() -> tuple[set, set]:
-
-    data_path = './data'
+def get_phone_set(run_mode: str, catalog: SuppressionCatalog) -> SuppressionIndex:
 
-    # Initial cleaning phone set
-    file_list = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold).csv",
-        "DNC (Cold-PD).csv",
-        "CallOut-14d+TextOut-30d (Cold).csv",
-        "CallTextOut-7d (PD).csv",
-        "PDConvDup (PD).csv",
-        "PDJRAADups (PD).csv"
-    ]
-    final_list_cleaner_df = pd.concat([pd.read_csv(os.path.join(data_path, file), low_memory=False, header=None) for file in file_list], ignore_index=True)
-    valid_phone_set = set(int(phone) for phone in map(str, final_list_cleaner_df[0].tolist()) if is_valid_phone(phone))
-
-    # Recleaning phone set
-    recleaning_list = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold).csv",
-        "DNC (Cold-PD).csv",
-        "PDConvDup (PD).csv",
-        "PDJRAADups (PD).csv"
-    ]
-    final_list_recleaner_df = pd.concat([pd.read_csv(os.path.join(data_path, file), low_memory=False, header=None) for file in recleaning_list], ignore_index=True)
-    valid_phone_reclean_set = set(int(phone) for phone in map(str, final_list_recleaner_df[0].tolist()) if is_valid_phone(phone))
-    
-    return valid_phone_set, valid_phone_reclean_set
+    if run_mode == 'recleaning':
+        return catalog.phones(RECLEANING_FILES)
 
-def get_id_set() -> set:
+    return catalog.phones(CLEANING_FILES)
 
-    unique_db_df = pd.read_csv('./data/UniqueDB ID (Cold).csv', low_memory=False)
-    valid_numbers = pd.to_numeric(unique_db_df['Deal - Unique Database ID'], errors='coerce')
-    valid_numbers = valid_numbers.dropna().astype(int)
-    valid_id_set = set(valid_numbers)
-    return valid_id_set
+def get_id_set(catalog: SuppressionCatalog) -> SuppressionIndex:
+    return catalog.ids(ID_FILE)
 
-def upper_first(text):
-    if pd.isna(text):
-        return text
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def upper_first(text: str) -> str:
     words = text.split()
-    return " ".join([word.title() if not re.fullmatch(r'(?i)(i{1,3}|iv|v?i{0,3}|ix|x{1,3}|xl|l{1,3}|xc|c{1,3}|cd|d{1,3}|cm|m{1,4})', word) else word.upper() for word in words])
+    return " ".join([word.upper() if ROMAN_NUMERAL_PATTERN.fullmatch(word) else word.title() for word in words])
 
-def export_text_marketing(df: pd.DataFrame, file_path: str, save_path: str):
+def case_names(column: pd.Series) -> pd.Series:
 
-    filename = os.path.basename(file_path)
-    if filename.endswith('.csv'):
-        df.to_csv(f"{save_path}/(Autodialer - Text Marketing) {filename}", index=False)
-    
-    elif filename.endswith('.xlsx'):
-        df.to_excel(f"{save_path}/(Autodialer - Text Marketing) {filename}", index=False)
+    # Names repeat a lot across rows, so each distinct name is cased once and mapped back
+    codes, uniques = pd.factorize(column)
+    cased = np.array([upper_first(name) if isinstance(name, str) else name for name in uniques], dtype=object)
+    values = column.to_numpy(dtype=object, copy=True)
+    values[codes >= 0] = cased[codes[codes >= 0]]
+    return pd.Series(values, index=column.index, name=column.name)
 
-    elif filename.endswith('.xlsb'):
-        df.to_excel(f"{save_path}/(Autodialer - Text Marketing) {filename.split('.')[0]}.xlsx", index=False)
-    
+def export_text_marketing(df: pd.DataFrame, file_path: str, save_path: str,
+                          shard_rows: int = None, shard_column: str = None):
+
+    path = output_path('Autodialer - Text Marketing', file_path, save_path)
+    if path:
+        write_output(df, path, shard_rows, shard_column)
     else:
         print("No output generated. Invalid file format")
 
@@ -271,7 +288,6 @@ def text_marketing_melt(df: pd.DataFrame):
 
     columns_to_transform = ['First Name', 'Owner']
     id_vars = [
-        'row_order',
         'date_created',
         'is_latest_offer',
         'First Name',
@@ -299,19 +315,21 @@ def text_marketing_melt(df: pd.DataFrame):
         'phone5'
     ]
 
+    phone_columns = ['phone1', 'phone2', 'phone3', 'phone4', 'phone5']
+
     df = df[selected_columns]
-    df['row_order'] = df.index
-    df[columns_to_transform] = df[columns_to_transform].map(upper_first)
-    df_melted = df.melt(id_vars=id_vars, 
-                        value_vars=['phone1', 'phone2', 'phone3', 'phone4', 'phone5'],
-                        var_name='Phone Index', 
-                        value_name='Phone Number')
-    df_melted = df_melted.dropna(subset=['Phone Number'])
-    df_melted['Phone Index'] = df_melted['Phone Index'].str.extract('(\d)').astype(int)
-    df_melted = df_melted.sort_values(by=['row_order', 'Phone Index'])
-    df_melted = df_melted.drop(columns='row_order').reset_index(drop=True)
+    df[columns_to_transform] = df[columns_to_transform].apply(case_names)
+
+    # One output row per filled phone cell. np.nonzero walks the cells row by row and then
+    # phone1 to phone5, which is already the output order.
+    phones = df[phone_columns].astype('Int64')
+    rows, slots = np.nonzero(phones.notna().to_numpy())
+    phone_numbers = np.column_stack([phones[phone].to_numpy(dtype=np.int64, na_value=0) for phone in phone_columns])
+
+    df_melted = df[id_vars].iloc[rows].reset_index(drop=True)
+    df_melted['Phone Index'] = slots + 1
+    df_melted['Phone Number'] = pd.array(phone_numbers[rows, slots], dtype='Int64')
     df_melted['Total Value - High ($)'] = df_melted['Total Value - High ($)'].astype('Int64')
-    df_melted['Phone Number'] = df_melted['Phone Number'].astype('Int64')
     export_df = df_melted[[
         'date_created',
         'is_latest_offer',
@@ -328,25 +346,90 @@ def text_marketing_melt(df: pd.DataFrame):
 
     return export_df
 
-def main(auth_code: str, list_files: tuple, save_path: str, run_mode: str):
+def build_phone_sources(valid_phone_set: SuppressionIndex, disposition_set: set, months_set: set) -> PhoneSourceIndex:
+    return PhoneSourceIndex.from_sources({
+        LIST_CLEANER_SOURCE: valid_phone_set.values,
+        DISPOSITION_SOURCE: np.fromiter(disposition_set, dtype=np.int64, count=len(disposition_set)),
+        SIX_MONTHS_SOURCE: np.fromiter(months_set, dtype=np.int64, count=len(months_set))
+    })
+
+def build_disposition_sources(disposition_set: set, months_set: set) -> PhoneSourceIndex:
+    return PhoneSourceIndex.from_sources({
+        DISPOSITION_SOURCE: np.fromiter(disposition_set, dtype=np.int64, count=len(disposition_set)),
+        SIX_MONTHS_SOURCE: np.fromiter(months_set, dtype=np.int64, count=len(months_set))
+    })
+
+def build_list_cleaner_sources(valid_phone_set: SuppressionIndex) -> PhoneSourceIndex:
+
+    # The suppression index is already sorted and unique, so every phone just gets the list cleaner bit
+    return PhoneSourceIndex(valid_phone_set.values, np.full(len(valid_phone_set), LIST_CLEANER_SOURCE, dtype=np.uint8))
+
+def describe_sources(bitmasks: np.ndarray) -> np.ndarray:
+    descriptions = {
+        bitmask: ', '.join(name for bit, name in SOURCE_NAMES.items() if bitmask & bit) for bitmask in np.unique(bitmasks)
+    }
+    return pd.Series(bitmasks).map(descriptions).to_numpy()
+
+def export_audit(removed_df: pd.DataFrame, file_path: str, save_path: str) -> None:
+    filename = os.path.splitext(os.path.basename(file_path))[0]
+    removed_df.to_csv(f"{save_path}/(Removal Audit) {filename}.csv", index=False)
+
+def sheet_names(file_names: list) -> list:
+    return [os.path.splitext(file_name)[0] for file_name in file_names]
+
+def load_list_cleaner(auth_code: str, run_mode: str) -> 'tuple[SuppressionIndex, SuppressionIndex | None]':
+
+    # Only the sheets the run mode uses are downloaded and parsed, recleaning skips the ID sheet
+    if run_mode == 'recleaning':
+        catalog = SuppressionCatalog(download_list_cleaner(auth_code, sheet_names=sheet_names(RECLEANING_FILES)))
+        return get_phone_set(run_mode, catalog), None
+
+    catalog = SuppressionCatalog(download_list_cleaner(auth_code, sheet_names=sheet_names(CLEANING_FILES + [ID_FILE])))
+    return get_phone_set(run_mode, catalog), get_id_set(catalog)
+
+def main(auth_code: str, list_files: tuple, save_path: str, run_mode: str, push_down: bool = False,
+         shard_rows: int = None, shard_column: str = None):
+
+    # With push_down the dispositions are matched in the database for each list instead of
+    # reading the whole disposition sets up front. It is not offered in the app until it has
+    # been run against the production database.
+    engine = None
+    phone_sources = None
+    list_cleaner_sources = None
+
+    # shard_rows or shard_column split every output into files of at most that many rows,
+    # or one file for each value of the column (such as the time zone)
+
+    # The list cleaner, the database and the input files are fetched at the same time, and
+    # each result is only waited on where it is first needed
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
 
     try:
-        download_list_cleaner(auth_code)
+        list_cleaner_future = executor.submit(load_list_cleaner, auth_code, run_mode)
 
-        valid_phone_set, valid_reclean_phone_set = get_phone_set()
-        valid_id_set = get_id_set()
-        disposition_set, months_set = read_cm_live_db()
-        
-        for list_file in list_files:
+        if push_down:
+            engine = create_cm_engine()
+        elif run_mode != 'recleaning':
+            dispositions_future = executor.submit(read_cm_live_db)
+
+        list_file_future = executor.submit(read_file, list_files[0]) if list_files else None
+
+        for position, list_file in enumerate(list_files):
 
             print(f"Processing file {os.path.basename(list_file)}")
-            list_df = read_file(list_file)
+            list_df = list_file_future.result()
+
+            # Read the next file while this one is cleaned
+            if position + 1 < len(list_files):
+                list_file_future = executor.submit(read_file, list_files[position + 1])
+
+            valid_phone_set, valid_id_set = list_cleaner_future.result()
 
             # Run recleaning
             if run_mode == 'recleaning':
                 list_df['Phone Number'] = list_df['Phone Number'].apply(pd.to_numeric, errors='coerce').astype('Int64')
-                recleaning_df = list_df[~list_df['Phone Number'].isin(valid_reclean_phone_set)]
-                export_reclean_output(recleaning_df, list_file, save_path)
+                recleaning_df = list_df[~valid_phone_set.contains(list_df['Phone Number'])]
+                export_reclean_output(recleaning_df, list_file, save_path, shard_rows, shard_column)
                 continue
 
             # Convert phone numbers to int
@@ -357,8 +440,25 @@ def main(auth_code: str, list_files: tuple, save_path: str, run_mode: str):
                 .astype('Int64')
             )
 
+            # The list cleaner and disposition sources of every phone cell. With push_down the list
+            # cleaner index is built once and only the dispositions of this list are indexed per file.
+            if push_down:
+                if list_cleaner_sources is None:
+                    list_cleaner_sources = build_list_cleaner_sources(valid_phone_set)
+                disposition_sources = build_disposition_sources(*read_matching_dispositions(engine, list_df[phone_columns]))
+                phone_sources = [list_cleaner_sources, disposition_sources]
+            elif phone_sources is None:
+                phone_sources = [build_phone_sources(valid_phone_set, *dispositions_future.result())]
+
+            stacked_phones = pd.concat([list_df[phone] for phone in phone_columns], ignore_index=True)
+            stacked_sources = np.bitwise_or.reduce([sources.lookup(stacked_phones) for sources in phone_sources])
+            cell_sources = pd.DataFrame(stacked_sources.reshape(len(phone_columns), len(list_df)).T,
+                                        index=list_df.index, columns=phone_columns)
+            row_sources = np.bitwise_or.reduce(cell_sources.to_numpy(), axis=1)
+
             # Search phones in cleaner file
-            output_df = list_df[~list_df[phone_columns].isin(valid_phone_set).any(axis=1)]
+            in_list_cleaner = (row_sources & LIST_CLEANER_SOURCE) > 0
+            output_df = list_df[~in_list_cleaner]
 
             # Remove Company contact type
             column_name = next((col for col in output_df.columns if col.strip().lower() == 'contact_type'), None)
@@ -371,23 +471,37 @@ def main(auth_code: str, list_files: tuple, save_path: str, run_mode: str):
             # Clean df based on contact id and deal id
             clean_contact_deal_df = clean_contact_id_deal_id(removed_dupes_df, valid_id_set)
 
-            # Check if has existing dispositions
-            clean_dispo_df = clean_contact_deal_df[~clean_contact_deal_df[phone_columns].isin(disposition_set).any(axis=1)]
+            # Check if has existing dispositions, or specific dispositions within 6 months, on the
+            # phones that are left after the dedup
+            remaining_sources = cell_sources.loc[clean_contact_deal_df.index].to_numpy()
+            remaining_sources[clean_contact_deal_df[phone_columns].isna().to_numpy()] = 0
+            disposition_sources = np.bitwise_or.reduce(remaining_sources, axis=1) & (DISPOSITION_SOURCE | SIX_MONTHS_SOURCE)
+
+            final_df = clean_contact_deal_df[disposition_sources == 0]
 
-            # Check if within 6 months for specific dispositions
-            final_df = clean_dispo_df[~clean_dispo_df[phone_columns].isin(months_set).any(axis=1)]
+            # Every row removed for one of the sources, with the sources that removed it
+            removed_df = pd.concat([
+                list_df[in_list_cleaner].assign(removal_source=SOURCE_NAMES[LIST_CLEANER_SOURCE]),
+                clean_contact_deal_df[disposition_sources > 0].assign(removal_source=describe_sources(disposition_sources[disposition_sources > 0]))
+            ])
+            export_audit(removed_df, list_file, save_path)
 
             if run_mode == 'text_marketing':
                 text_marketing_df = text_marketing_melt(final_df)
-                export_text_marketing(text_marketing_df, list_file, save_path)
+                export_text_marketing(text_marketing_df, list_file, save_path, shard_rows, shard_column)
             else:
-                export_output(final_df, list_file, save_path)
+                export_output(final_df, list_file, save_path, shard_rows, shard_column)
         
         print("Sucessfully processed all files")
 
     except Exception as e:
         print(f"An error occurred: {e}")
-        raise RuntimeError   
+        raise RuntimeError
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if engine is not None:
+            engine.dispose()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+import sqlite3
+import pandas as pd
+from datetime import date
+from sqlalchemy import text
+
+DISPOSITION_CACHE_PATH = "./data/cm_dispositions.sqlite"
+
+# Calls this far behind the newest cached call are fetched again, so rows that land late are not missed
+HIGH_WATER_OVERLAP = pd.Timedelta(days=1)
+
+DISPOSITIONS = (
+    'Business/ Work number',
+    'Sold Interests',
+    'Incorrect contact / Wrong number',
+    'Do Not Call Again (remove from list)',
+    'Invalid Number',
+    'Proactive Identified - Answering Machine Left Message',
+    'Answering Machine Left Message'
+)
+RECENT_DISPOSITIONS = ('Lead Not interested', 'Uncooperative Lead')
+RECENT_DISPOSITION_MONTHS = 6
+
+latest_dispositions_query = """
+SELECT
+    dnis_to,
+    primary_disposition,
+    MAX(start_time) AS last_start_time
+FROM
+    max_outbound_calls
+WHERE
+    primary_disposition IN ({dispositions})
+    {since_filter}
+GROUP BY
+    dnis_to,
+    primary_disposition
+"""
+
+
+def sql_list(values: tuple) -> str:
+    return ', '.join(f"'{value}'" for value in values)
+
+
+def open_disposition_cache(path: str = DISPOSITION_CACHE_PATH) -> sqlite3.Connection:
+
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS dispositions (
+            dnis_to TEXT NOT NULL,
+            primary_disposition TEXT NOT NULL,
+            last_start_time TEXT,
+            PRIMARY KEY (dnis_to, primary_disposition)
+        )
+    """)
+    return connection
+
+
+def high_water_mark(connection: sqlite3.Connection) -> 'str | None':
+    return connection.execute("SELECT MAX(last_start_time) FROM dispositions").fetchone()[0]
+
+
+def update_disposition_cache(connection: sqlite3.Connection, engine) -> int:
+
+    # Only calls newer than the high-water mark are read, the first run reads everything
+    mark = high_water_mark(connection)
+    params = {}
+    since_filter = ''
+    if mark:
+        since_filter = 'AND start_time > :since'
+        params['since'] = (pd.Timestamp(mark) - HIGH_WATER_OVERLAP).strftime('%Y-%m-%d %H:%M:%S')
+
+    query = latest_dispositions_query.format(dispositions=sql_list(DISPOSITIONS + RECENT_DISPOSITIONS), since_filter=since_filter)
+    new_df = pd.read_sql_query(text(query), engine, params=params)
+
+    new_df = new_df[new_df['dnis_to'].notna()]
+    new_df['dnis_to'] = new_df['dnis_to'].astype(str)
+    new_df['last_start_time'] = pd.to_datetime(new_df['last_start_time'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+    rows = new_df[['dnis_to', 'primary_disposition', 'last_start_time']].astype(object)
+    rows = rows.where(rows.notna(), None)
+
+    # Keep the latest call of every number and disposition
+    with connection:
+        connection.executemany("""
+            INSERT INTO dispositions (dnis_to, primary_disposition, last_start_time) VALUES (?, ?, ?)
+            ON CONFLICT (dnis_to, primary_disposition) DO UPDATE SET
+                last_start_time = NULLIF(MAX(COALESCE(last_start_time, ''), COALESCE(excluded.last_start_time, '')), '')
+        """, rows.itertuples(index=False, name=None))
+
+    return len(rows)
+
+
+def to_phone_set(dnis_to: pd.Series) -> set:
+    phones = pd.to_numeric(dnis_to, errors='coerce').astype('Int64')
+    return set(phones[phones.notna()].map(int))
+
+
+def read_phone_set(connection: sqlite3.Connection, query: str, params: tuple) -> set:
+    return to_phone_set(pd.read_sql_query(query, connection, params=params)['dnis_to'])
+
+
+def recent_window_start(run_date: date = None) -> str:
+
+    # The six month window is measured from the run date, like DATE_ADD(CURRENT_DATE, INTERVAL -6 MONTH),
+    # and has no upper bound so the calls made today are in it
+    window_start = pd.Timestamp(run_date or date.today()) - pd.DateOffset(months=RECENT_DISPOSITION_MONTHS)
+    return window_start.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_disposition_sets(connection: sqlite3.Connection, run_date: date = None) -> 'tuple[set, set]':
+
+    placeholders = ', '.join('?' * len(DISPOSITIONS))
+    disposition_set = read_phone_set(connection,
+                                     f"SELECT DISTINCT dnis_to FROM dispositions WHERE primary_disposition IN ({placeholders})",
+                                     DISPOSITIONS)
+
+    placeholders = ', '.join('?' * len(RECENT_DISPOSITIONS))
+    months_set = read_phone_set(connection,
+                                f"SELECT DISTINCT dnis_to FROM dispositions WHERE primary_disposition IN ({placeholders}) "
+                                f"AND last_start_time >= ?",
+                                RECENT_DISPOSITIONS + (recent_window_start(run_date),))
+
+    return disposition_set, months_set
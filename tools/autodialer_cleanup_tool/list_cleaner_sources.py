@@ -0,0 +1,139 @@
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+from tools.phone_cleanup_tool.list_cleaner import read_manifest, remove_stale_files, write_atomic, write_manifest
+
+SOURCE_MANIFEST_PATH = "./data/list_cleaner_sources.json"
+SOURCE_CACHE_PATH = "./data/list_cleaner_sources"
+SOURCE_HASH_LENGTH = 16
+SOURCE_CACHE_PATTERN = re.compile(fr"[0-9a-f]{{{SOURCE_HASH_LENGTH}}}\.[0-9a-f]{{{SOURCE_HASH_LENGTH}}}\.pkl")
+
+# Bumped when the stored contributions change shape, so the ones stored before are rebuilt
+SOURCE_MANIFEST_VERSION = 2
+SEVEN_DAYS = 7
+
+
+class SourceContribution(NamedTuple):
+
+    # Rows one source export adds to each list cleaner sheet, and its outbound contacts with
+    # the time they were made so the rolling windows can be measured when the files are saved
+    sheets: dict
+    outbound: pd.DataFrame = None
+
+
+def outbound_events(phones: pd.Series, times: pd.Series = None, days: int = None) -> pd.DataFrame:
+
+    # Phones are kept as int64, the ones that are not numbers are dropped
+    numbers = pd.to_numeric(phones, errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(numbers)
+    events = pd.DataFrame({'phone': numbers[valid].astype(np.int64)})
+
+    if times is None:
+        events['time'] = pd.NaT
+        events['utc'] = False
+    else:
+        # Timezone aware times are kept as UTC and compared with the UTC clock, the rest with the local clock
+        utc = getattr(times.dt, 'tz', None) is not None
+        events['time'] = (times.dt.tz_convert('UTC').dt.tz_localize(None) if utc else times).to_numpy()[valid]
+        events['utc'] = utc
+    events['days'] = float('nan') if days is None else float(days)
+
+    # Contacts older than the window can never come back into it, so they are not kept
+    return events[in_window(events, events['days'])].drop_duplicates(subset=['phone', 'time'])
+
+
+def in_window(events: pd.DataFrame, days: pd.Series) -> pd.Series:
+
+    now = pd.Series(pd.Timestamp.now(), index=events.index)
+    now[events['utc'].to_numpy(dtype=bool)] = pd.Timestamp.utcnow().tz_localize(None)
+    age = now - pd.to_datetime(events['time'])
+
+    # Contacts without a window never expire
+    return days.isna() | (age <= pd.to_timedelta(days, unit='D'))
+
+
+def outbound_windows(contributions: list) -> 'tuple[np.ndarray, np.ndarray]':
+
+    # Phones contacted within each source's own window, and phones contacted in the last 7 days
+    # by the sources that have a window. Every export adds one int64 chunk to each window and
+    # the chunks are merged once.
+    outbound_chunks = [np.empty(0, dtype=np.int64)]
+    outbound_seven_chunks = [np.empty(0, dtype=np.int64)]
+
+    for contribution in contributions:
+        events = contribution.outbound
+        if events is None:
+            continue
+
+        phones = events['phone'].to_numpy(dtype=np.int64)
+        seven_days = pd.Series(float(SEVEN_DAYS), index=events.index).where(events['days'].notna())
+        outbound_chunks.append(phones[in_window(events, events['days']).to_numpy(dtype=bool)])
+        outbound_seven_chunks.append(phones[(events['days'].notna() & in_window(events, seven_days)).to_numpy(dtype=bool)])
+
+    return np.unique(np.concatenate(outbound_chunks)), np.unique(np.concatenate(outbound_seven_chunks))
+
+
+def path_digest(path: str) -> str:
+    return hashlib.sha256(path.encode()).hexdigest()[:SOURCE_HASH_LENGTH]
+
+
+class SourceManifest:
+
+    # Dropbox rev and content hash of every source export that went into the last uploaded
+    # list cleaner, with the contribution each one made kept as a pickle next to the manifest
+    def __init__(self, path: str = SOURCE_MANIFEST_PATH, cache_path: str = SOURCE_CACHE_PATH):
+        manifest = read_manifest(path)
+        self.path = path
+        self.cache_path = cache_path
+        self.files = manifest.get('files', {}) if manifest.get('version') == SOURCE_MANIFEST_VERSION else {}
+        self.uploaded = manifest.get('uploaded', {})
+        self.used = {}
+        self.lock = threading.Lock()
+
+    def base_is_current(self, content_hashes: dict, file_names: list) -> bool:
+
+        # The unchanged exports are already in the base sheets only if nobody replaced them
+        # since this tool uploaded them
+        return bool(self.uploaded) and all(
+            self.uploaded.get(file_name) == content_hashes.get(file_name) for file_name in file_names
+        )
+
+    def contribution(self, entry, dbx, read, contribute) -> 'tuple[SourceContribution, bool]':
+
+        # Returns the export's contribution and whether it is new or changed since the last upload
+        recorded = self.files.get(entry.path_lower, {})
+        if recorded.get('rev') == entry.rev and recorded.get('content_hash') == entry.content_hash:
+            cached_path = os.path.join(self.cache_path, recorded['contribution'])
+            if os.path.exists(cached_path):
+                with self.lock:
+                    self.used[entry.path_lower] = recorded
+                return pd.read_pickle(cached_path), False
+
+        contribution = contribute(read(entry.path_lower, dbx))
+
+        name = f"{path_digest(entry.path_lower)}.{entry.content_hash[:SOURCE_HASH_LENGTH]}.pkl"
+        os.makedirs(self.cache_path, exist_ok=True)
+        write_atomic(os.path.join(self.cache_path, name), lambda temp_path: pd.to_pickle(contribution, temp_path))
+
+        with self.lock:
+            self.used[entry.path_lower] = {
+                'rev': entry.rev,
+                'content_hash': entry.content_hash,
+                'contribution': name
+            }
+
+        return contribution, True
+
+    def save(self, uploaded: dict) -> None:
+
+        # Only the exports this run used are kept, the contributions of removed or replaced
+        # exports are deleted
+        if os.path.isdir(self.cache_path):
+            remove_stale_files(self.cache_path, SOURCE_CACHE_PATTERN,
+                               {recorded['contribution'] for recorded in self.used.values()})
+
+        write_manifest({'version': SOURCE_MANIFEST_VERSION, 'files': self.used, 'uploaded': uploaded}, self.path)
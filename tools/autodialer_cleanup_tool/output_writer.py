@@ -0,0 +1,114 @@
+import os
+import re
+import concurrent.futures
+import pandas as pd
+import xlsxwriter
+from datetime import datetime
+
+MAX_SHARD_WRITERS = 4
+
+# Characters that cannot be used in Windows file names
+INVALID_FILENAME_CHARACTERS = re.compile(r'[\\/:*?"<>|]')
+
+
+def write_xlsx_streaming(df: pd.DataFrame, path: str) -> None:
+
+    # In constant_memory mode every row is flushed to disk once the next row starts, so the
+    # rows have to be written in order, which pandas' to_excel does not do
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+
+    worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+    for row_number, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        for column_number, value in enumerate(row):
+            # NaT is a datetime too, so blanks are skipped before dates are written
+            if pd.isna(value):
+                continue
+            elif isinstance(value, datetime):
+                worksheet.write_datetime(row_number, column_number, value, date_format)
+            else:
+                worksheet.write(row_number, column_number, value)
+
+    workbook.close()
+
+
+def parse_shard_rows(text: str) -> 'int | None':
+
+    # Blank means every list is written as one file
+    if not text or not text.strip():
+        return None
+
+    rows = int(text.strip())
+    if rows < 1:
+        raise ValueError(f"Rows per file must be a positive number, got {rows}")
+    return rows
+
+
+def write_shard(df: pd.DataFrame, path: str) -> None:
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        write_xlsx_streaming(df, path)
+
+
+def shard_file_names(names: list) -> list:
+
+    # Different values can clean up to the same file name, and Windows ignores case, so
+    # repeated names get a number added instead of overwriting each other
+    used = set()
+    file_names = []
+    for name in names:
+        file_name = INVALID_FILENAME_CHARACTERS.sub('-', name)
+        candidate, number = file_name, 1
+        while candidate.casefold() in used:
+            number += 1
+            candidate = f"{file_name} {number}"
+        used.add(candidate.casefold())
+        file_names.append(candidate)
+    return file_names
+
+
+def row_parts(df: pd.DataFrame, shard_rows: int, prefix: str = '') -> list:
+    return [
+        (f"{prefix}Part {number}", df.iloc[start:start + shard_rows])
+        for number, start in enumerate(range(0, len(df), shard_rows), start=1)
+    ]
+
+
+def shard_frames(df: pd.DataFrame, shard_rows: int = None, shard_column: str = None) -> list:
+
+    # Returns (name, frame) pairs, one for each output file, with names that are safe and
+    # unique as file names
+    if not shard_column:
+        return row_parts(df, shard_rows)
+
+    if shard_column not in df.columns:
+        raise ValueError(f"Cannot split the output by {shard_column}: the column does not exist")
+    groups = [(value, shard) for value, shard in df.groupby(shard_column, sort=False, dropna=False)]
+    names = shard_file_names(['Blank' if pd.isna(value) else str(value) for value, _ in groups])
+    groups = [(name, shard) for name, (_, shard) in zip(names, groups)]
+
+    # With both set, every value is split again so no file goes over the row limit
+    if shard_rows:
+        return [part for name, shard in groups for part in row_parts(shard, shard_rows, f"{name} ")]
+    return groups
+
+
+def write_output(df: pd.DataFrame, path: str, shard_rows: int = None, shard_column: str = None) -> None:
+
+    if not shard_rows and not shard_column:
+        if path.endswith('.csv'):
+            df.to_csv(path, index=False)
+        else:
+            df.to_excel(path, index=False)
+        return
+
+    # Split the output into files the dialer can import, written side by side
+    shards = shard_frames(df, shard_rows, shard_column) or [('Part 1', df)]
+    root, extension = os.path.splitext(path)
+    shard_paths = [f"{root} ({name}){extension}" for name, _ in shards]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_SHARD_WRITERS) as executor:
+        list(executor.map(write_shard, [shard for _, shard in shards], shard_paths))
@@ -0,0 +1,79 @@
+import os
+import re
+import hashlib
+import pandas as pd
+from datetime import datetime
+from tools.phone_cleanup_tool.list_cleaner import write_atomic
+
+WORKBOOK_CACHE_PATH = "./data/workbook_cache"
+WORKBOOK_HASH_LENGTH = 16
+
+# Day zero of Excel serial dates
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            digest.update(block)
+    return digest.hexdigest()[:WORKBOOK_HASH_LENGTH]
+
+
+def to_excel_serials(dates: pd.Series) -> pd.Series:
+
+    # pyxlsb returns whole numbers as ints and the rest as floats
+    serials = (pd.to_datetime(dates) - EXCEL_EPOCH) / pd.Timedelta(days=1)
+    if serials.notna().all() and (serials % 1 == 0).all():
+        return serials.astype('int64')
+    return serials
+
+
+def keep_excel_serials(df: pd.DataFrame) -> pd.DataFrame:
+
+    # Calamine reads date cells as timestamps while pyxlsb leaves them as Excel serial numbers,
+    # so the dates are turned back into serials to keep the output the same
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column].dtype):
+            df[column] = to_excel_serials(df[column])
+
+        elif df[column].dtype == object:
+            is_date = df[column].map(lambda value: isinstance(value, datetime)).to_numpy(dtype=bool)
+            if is_date.any():
+                serials = to_excel_serials(df.loc[is_date, column])
+                df[column] = df[column].where(~is_date, serials.astype(object))
+
+    return df
+
+
+def parse_xlsb_sheet(path: str, sheet_name: str) -> pd.DataFrame:
+    try:
+        return keep_excel_serials(pd.read_excel(path, engine='calamine', sheet_name=sheet_name))
+    except ImportError:
+        return pd.read_excel(path, engine='pyxlsb', sheet_name=sheet_name)
+
+
+def read_xlsb_sheet(path: str, sheet_name: str = 'List', cache_path: str = WORKBOOK_CACHE_PATH) -> pd.DataFrame:
+
+    # The parsed sheet is kept as a pickle keyed by the workbook's content hash and mtime,
+    # so running the same list again in another mode skips the parse
+    name, _ = os.path.splitext(os.path.basename(path))
+    cache_key = f"{file_digest(path)}.{os.stat(path).st_mtime_ns}"
+    cached_path = os.path.join(cache_path, f"{name}.{sheet_name}.{cache_key}.pkl")
+
+    if os.path.exists(cached_path):
+        return pd.read_pickle(cached_path)
+
+    df = parse_xlsb_sheet(path, sheet_name)
+
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+
+        # The caches of previous versions of the workbook are dropped
+        prefix = re.escape(f"{name}.{sheet_name}.")
+        write_atomic(cached_path, df.to_pickle, re.compile(fr"{prefix}[0-9a-f]{{{WORKBOOK_HASH_LENGTH}}}\.\d+\.pkl"))
+
+    except OSError:
+        pass
+
+    return df
@@ -1,35 +1,36 @@
-import re
 import os
-import dropbox
+import glob
+import itertools
+import math
+import tempfile
+import concurrent.futures
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-
-def download_list_cleaner(auth_code: str) -> None:
-    global dnc_df, mvp_df, db_id_df, time_df, conv_df
-
-    print("Downloading list cleaner files")
-
-    sheet_names = [
-        "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)",
-        "DNC (Cold-PD)",
-        "UniqueDB ID (Cold)",
-        "CallOut-14d+TextOut-30d (Cold)",
-        "CallTextOut-7d (PD)",
-        "PDConvDup (PD)",
-        "PDJRAADups (PD)"
-    ]
-
-    for sheet_name in sheet_names:
-        dropbox_path = f"/List Cleaner & JC DNC/{sheet_name}.csv"
-        local_file_path = f"./data/{sheet_name}.csv"
-        dbx = dropbox.Dropbox(auth_code)
-        metadata, response = dbx.files_download(dropbox_path)
-
-        with open(local_file_path, 'wb') as f:
-            f.write(response.content)
-
-def is_valid_phone(phone):
-    return bool(re.fullmatch(r'\d{10,15}', phone))
+from datetime import date, datetime
+from .filter_rules import DateWindow, tag_rows, decode_reasons
+from .list_cleaner import SuppressionIndex, download_list_cleaner, load_sheet_phones, load_sheet_ids, to_int64_keys
+from .run_report import RunReport
+
+# CSV inputs larger than this are processed chunk by chunk instead of in memory
+CHUNKED_FILE_SIZE = 512 * 1024 ** 2
+CHUNK_SIZE = 200_000
+
+# Bytes of input that are spilled to each partition of a chunked run
+PARTITION_SIZE = 128 * 1024 ** 2
+
+OUTPUT_COLUMNS = [
+    'phone_number',
+    'contact_id',
+    'carrier_type',
+    'full_name',
+    'first_name',
+    'last_name',
+    'target_county',
+    'target_state',
+    'phone_index',
+    'time_zone',
+    'reason_for_removal'
+]
 
 def read_file(path: str):
 
@@ -43,129 +44,45 @@ def read_file(path: str):
         raise ValueError("Invalid file format: Please provide a .csv or .xlsx file.")
 
     
-def apply_mask(df: pd.DataFrame, mask, output_value) -> None:
-    df.loc[mask, 'reason_for_removal'] = df.loc[mask, 'reason_for_removal'].apply(
-        lambda lst: lst + [output_value] if isinstance(lst, list) else [output_value])
+def apply_all_filters(df: pd.DataFrame, run_mode: str, date_window: DateWindow = None,
+                      report: RunReport = None) -> pd.DataFrame:
 
+    report = report or RunReport()
 
-def check_date(df: pd.DataFrame, col: str) -> pd.DataFrame:
-    current_date = datetime.now().date()
-    seven_days_ago = current_date - timedelta(days=7)
-    df[col] = pd.to_datetime(df[col], errors='coerce').dt.date
-    mask = (df[col] >= seven_days_ago) & (df[col] <= current_date)
+    with report.stage('filters'):
+        df['reason_for_removal'] = tag_rows(df, run_mode, date_window)
+        report.count_reasons(df['reason_for_removal'].to_numpy())
 
-    return mask
+    # Deduplication
+    with report.stage('dedup'):
+        df_longest_reason = df.iloc[longest_reason_rows(df['phone_number'], df['reason_for_removal'].to_numpy())]
 
+    return title_case_names(df_longest_reason)
 
-def check_date_30_days(df: pd.DataFrame, col: str) -> pd.DataFrame:
-    current_date = datetime.now().date()
-    thirty_days_ago = current_date - timedelta(days=30)
-    df[col] = pd.to_datetime(df[col], errors='coerce').dt.date
-    mask = (df[col] >= thirty_days_ago) & (df[col] <= current_date)
+def longest_reason_rows(phone_numbers: pd.Series, codes: np.ndarray) -> np.ndarray:
 
-    return mask
+    # Positions of the row with the most reasons per phone number, ties going to the
+    # earliest row, in the order each phone number first appears. Blank numbers are dropped.
+    groups, _ = pd.factorize(phone_numbers, sort=False)
+    positions = np.flatnonzero(groups >= 0)
+    reason_counts = np.bitwise_count(codes[positions]).astype(np.int16)
 
+    # Stable sort by group, then by most reasons, so the first row of each group wins
+    order = positions[np.lexsort((-reason_counts, groups[positions]))]
+    sorted_groups = groups[order]
+    group_starts = np.diff(sorted_groups, prepend=-1) != 0
 
-def apply_all_filters(df: pd.DataFrame, run_mode: str) -> pd.DataFrame:
-    
-    df['reason_for_removal'] = [[] for _ in range(len(df))]
-    
-    if 'Rolling 30 Days Rvm Count' in df.columns:
-        df['Rolling 30 Days Rvm Count'] = pd.to_numeric(df['Rolling 30 Days Rvm Count'], errors='coerce')
-    
-    if 'Rolling 30 Days Text Marketing Count' in df.columns:
-        df['Rolling 30 Days Text Marketing Count'] = pd.to_numeric(df['Rolling 30 Days Text Marketing Count'], errors='coerce')
-    
-    if 'Rolling 30 Days Max Outbound Count' in df.columns:
-        df['Rolling 30 Days Max Outbound Count'] = pd.to_numeric(df['Rolling 30 Days Max Outbound Count'], errors='coerce')
-
-    if 'in_pipedrive' in df.columns:
-        in_pipedrive_mask = df['in_pipedrive'].str.upper() == 'Y'
-        apply_mask(df, in_pipedrive_mask, 'in_pipedrive is Y')
-
-    if 'rc_pd' in df.columns:
-        rc_pd_mask = df['rc_pd'].str.upper() == 'YES'
-        apply_mask(df, rc_pd_mask, 'rc_pd is Yes')
-
-    if run_mode == 'text_marketing':
-        if 'type' and 'carrier_type' in df.columns:
-            type_ctype_mask = (df['type'].str.upper() == 'LANDLINE') & (df['carrier_type'].str.upper() == 'LANDLINE')
-            apply_mask(df, type_ctype_mask, 'Both type & carrier_type are Landline')
-
-    if 'text_opt_in' in df.columns:
-        text_opt_in_mask = df['text_opt_in'].str.upper() == 'NO'
-        apply_mask(df, text_opt_in_mask, 'text_opt_in is No')
-
-    if 'contact_deal_id' in df.columns:
-        contact_deal_id_mask = df['contact_deal_id'].notna()
-        apply_mask(df, contact_deal_id_mask, 'contact_deal_id Not Empty')
-
-    if 'contact_deal_status' in df.columns:
-        contact_deal_status_mask = df['contact_deal_status'].notna()
-        apply_mask(df, contact_deal_status_mask, 'contact_deal_status Not Empty')
-
-    if 'contact_person_id' in df.columns:
-        contact_person_id_mask = df['contact_person_id'].notna()
-        apply_mask(df, contact_person_id_mask, 'contact_person_id Not Empty')
-
-    if 'phone_number_deal_id' in df.columns:
-        phone_number_deal_id_mask = df['phone_number_deal_id'].notna()
-        apply_mask(df, phone_number_deal_id_mask, 'phone_number_deal_id Not Empty')
-
-    if 'phone_number_deal_status' in df.columns:
-        phone_number_deal_status_mask = df['phone_number_deal_status'].notna()
-        apply_mask(df, phone_number_deal_status_mask, 'phone_number_deal_status Not Empty')
-
-    if 'RVM - Last RVM Date' in df.columns:
-        last_rvm_mask = check_date(df, 'RVM - Last RVM Date')
-        apply_mask(df, last_rvm_mask, 'RVM - Last RVM Date - last 7 days from tool run date')
-
-    if run_mode == 'text_marketing':
-        if 'Latest Text Marketing Date (Sent)' in df.columns:
-            last_marketing_text_mask = check_date(df, 'Latest Text Marketing Date (Sent)')
-            apply_mask(df, last_marketing_text_mask, 'Latest Text Marketing Date (Sent) - last 7 days from tool run date')
-
-    if 'Rolling 30 Days Max Outbound Count' and 'Rolling 30 Days Text Marketing Count' in df.columns:
-        rolling_days_mask = (df['Rolling 30 Days Max Outbound Count'] + df['Rolling 30 Days Text Marketing Count']) >= 3
-        apply_mask(df, rolling_days_mask, 'Rolling 30 Days Max Outbound Count and Rolling 30 Days Text Marketing Count - total >= 3')
-
-    if 'Deal - ID' in df.columns:
-        deal_id_mask = df['Deal - ID'].notna()
-        apply_mask(df, deal_id_mask, 'Deal - ID Not Empty')
-
-    if 'Deal - Text Opt-in' in df.columns:
-        deal_text_opt_in = df['Deal - Text Opt-in'].str.upper().str.contains('NO', na=False)
-        apply_mask(df, deal_text_opt_in, 'Deal - Text Opt-in is No')
-
-    if run_mode == 'call_marketing':
-        # Updated this old mask from 7 days to 30 days
-        if 'Latest Text Marketing Date (Sent)' in df.columns:
-            last_marketing_text_mask = check_date_30_days(df, 'Latest Text Marketing Date (Sent)')
-            apply_mask(df, last_marketing_text_mask, 'Latest Text Marketing Date (Sent) - last 30 days from tool run date')
-
-        # All below masks are new conditions
-        if 'Latest Text Marketing Date (Received)' in df.columns:
-            last_marketing_text_mask = check_date_30_days(df, 'Latest Text Marketing Date (Received)')
-            apply_mask(df, last_marketing_text_mask, 'Latest Text Marketing Date (Received) - last 30 days from tool run date')
-
-        if 'RVM - Last Reason for Failure' in df.columns:
-            rvm_last_reason_mask = df['RVM - Last Reason for Failure'].isin(["Not Covered", "Removed", "Do not Dial List removed"])
-            apply_mask(df, rvm_last_reason_mask, 'RVM - Last Reason for Failure is either Not Covered, Removed, Do not Dial List removed')
-    
-    """End of new conditions"""
-    
-    # Deduplication
-    df['reason_length'] = df['reason_for_removal'].apply(len)
-    df_longest_reason = df.loc[df.groupby('phone_number', sort=False)['reason_length'].idxmax()]
-    df_longest_reason = df_longest_reason.drop(columns=['reason_length'])
+    return order[group_starts]
+
+def title_case_names(df: pd.DataFrame) -> pd.DataFrame:
 
     # Capitalization of names
     columns_to_transform = ['full_name', 'first_name', 'last_name']
-    df_longest_reason[columns_to_transform] = df_longest_reason[columns_to_transform].applymap(lambda x: x.title() if isinstance(x, str) else x)
+    df[columns_to_transform] = df[columns_to_transform].applymap(lambda x: x.title() if isinstance(x, str) else x)
 
-    return df_longest_reason
+    return df
 
-def get_phone_set(run_mode: str) -> set:
+def get_phone_set(run_mode: str, content_hashes: dict = None) -> SuppressionIndex:
 
     data_path = './data'
     file_list = [
@@ -177,27 +94,21 @@ def get_phone_set(run_mode: str) -> set:
         "PDJRAADups (PD).csv"
     ]
     if run_mode == 'recleaning':
-        file_list.remove('CallOut-14d+TextOut-30d.csv')
-        
-    final_list_cleaner_df = pd.concat([pd.read_csv(os.path.join(data_path, file), low_memory=False, header=None) for file in file_list], ignore_index=True)
-
-    # Clean up the list and filter for valid phone numbers
-    valid_phone_set = set(int(phone) for phone in map(str, final_list_cleaner_df[0].tolist()) if is_valid_phone(phone))
-    return valid_phone_set
+        file_list.remove('CallOut-14d+TextOut-30d (Cold).csv')
 
-def get_id_set() -> set:
+    # Load the valid phone numbers of each sheet, from its snapshot when unchanged
+    content_hashes = content_hashes or {}
+    return SuppressionIndex.union([load_sheet_phones(os.path.join(data_path, file), content_hashes.get(file)) for file in file_list])
 
-    unique_db_df = pd.read_csv('./data/UniqueDB ID (Cold).csv', low_memory=False)
-    valid_numbers = pd.to_numeric(unique_db_df['Deal - Unique Database ID'], errors='coerce')
-    valid_numbers = valid_numbers.dropna().astype(int)
-    valid_id_set = set(valid_numbers)
-    return valid_id_set
+def get_id_set(content_hashes: dict = None) -> SuppressionIndex:
+    content_hashes = content_hashes or {}
+    return load_sheet_ids('./data/UniqueDB ID (Cold).csv', content_hashes.get('UniqueDB ID (Cold).csv'))
 
-def clean_contact_id(df: pd.DataFrame, id_set: set) -> pd.DataFrame:
+def clean_contact_id(df: pd.DataFrame, id_set: SuppressionIndex) -> pd.DataFrame:
 
     if 'contact_id' in df.columns:
         df['contact_id'] = df['contact_id'].apply(pd.to_numeric, errors='coerce').astype('Int64')
-        df = df[~df['contact_id'].isin(id_set)]
+        df = df[~id_set.contains(df['contact_id'])]
 
     return df
 
@@ -205,23 +116,9 @@ def export_output(df: pd.DataFrame, file_path: str, save_path: str) -> None:
 
     filename = os.path.basename(file_path)
 
-    df['reason_for_removal'] = df['reason_for_removal'].apply(
-        lambda lst: ', '.join(lst) if isinstance(lst, list) else lst
-    )
-
-    output_df = df[[
-        'phone_number',
-        'contact_id',
-        'carrier_type',
-        'full_name',
-        'first_name',
-        'last_name',
-        'target_county',
-        'target_state',
-        'phone_index',
-        'time_zone',
-        'reason_for_removal'
-    ]]
+    df['reason_for_removal'] = decode_reasons(df['reason_for_removal'])
+
+    output_df = df[OUTPUT_COLUMNS]
 
     if filename.endswith('.csv'):
         output_df.to_csv(f"{save_path}/(With Cleanup Tagging) {filename}", index=False)
@@ -232,25 +129,228 @@ def export_output(df: pd.DataFrame, file_path: str, save_path: str) -> None:
     else:
         print("No output generated. Invalid file format")
 
+def write_spill(df: pd.DataFrame, directory: str, name: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    df.to_pickle(os.path.join(directory, f"{name}.pkl"))
 
-def main(auth_code: str, files: tuple, save_path: str, run_mode: str):
+def read_spill(directory: str) -> pd.DataFrame:
+    paths = sorted(glob.glob(os.path.join(directory, '*.pkl')))
+    return pd.concat([pd.read_pickle(path) for path in paths]) if paths else None
 
-    try:
-        download_list_cleaner(auth_code)
+def phone_dtype(phones: pd.Series, numbers: pd.Series) -> 'str | None':
 
-        valid_phone_set = get_phone_set(run_mode)
-        valid_id_set = get_id_set()
+    # The dtype read_csv infers for phone numbers read as text: int64 or float64 when every
+    # value is a number, None when some are not and the column stays text
+    if numbers.notna().sum() != phones.notna().sum():
+        return None
+    if phones.isna().any() or not pd.api.types.is_integer_dtype(numbers.dtype):
+        return 'float64'
+    return 'int64'
 
-        for file in files:
+def common_phone_dtype(dtypes: set) -> 'str | None':
+    if None in dtypes:
+        return None
+    return 'float64' if 'float64' in dtypes else 'int64'
 
-            print(f"Processing file {file}")
+def process_file_chunked(file_path: str, save_path: str, run_mode: str,
+                         phone_index: SuppressionIndex, id_index: SuppressionIndex,
+                         chunk_size: int = CHUNK_SIZE, run_date: date = None,
+                         report: RunReport = None) -> None:
 
+    report = report or RunReport()
+    filename = os.path.basename(file_path)
+    output_path = f"{save_path}/(With Cleanup Tagging) {filename}"
+    partition_count = max(1, math.ceil(os.path.getsize(file_path) / PARTITION_SIZE))
+    spill_columns = [column for column in OUTPUT_COLUMNS if column != 'reason_for_removal']
+
+    # One date window for the whole file so the date formats are only inferred once
+    date_window = DateWindow(run_date)
+
+    with tempfile.TemporaryDirectory() as spill_path:
+
+        # Tag every chunk and spill it into hash partitions on phone_number, so that
+        # all rows of a phone number end up in the same partition. The numbers are spilled
+        # as read and only converted once the dtype of the whole column is known, so the
+        # output matches the in-memory path.
+        total_rows = 0
+        dtypes = set()
+        reader = pd.read_csv(file_path, low_memory=False, chunksize=chunk_size, dtype={'phone_number': str})
+        for chunk_number in itertools.count():
+            with report.stage('read'):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+
+            with report.stage('filters'):
+                codes = tag_rows(chunk, run_mode, date_window)
+                report.count_reasons(codes)
+
+            # The int64 keys only place and suppress the rows, numbers that are not whole
+            # or are blank get a partition of their own
+            numbers = pd.to_numeric(chunk['phone_number'], errors='coerce')
+            dtypes.add(phone_dtype(chunk['phone_number'], numbers))
+            keys, valid = to_int64_keys(numbers)
+
+            part = chunk[spill_columns].assign(reason_for_removal=codes)
+            part.index = pd.RangeIndex(total_rows, total_rows + len(chunk), name='row_order')
+            total_rows += len(chunk)
+
+            # Suppressed phones drop every row of the number, so they can go before the dedup
+            with report.stage('suppression'):
+                kept = ~phone_index.contains(numbers)
+                part, keys, valid = part[kept], keys[kept], valid[kept]
+
+            with report.stage('dedup'):
+                partitions = np.where(valid, keys % partition_count, partition_count)
+                for partition in np.unique(partitions):
+                    write_spill(part[partitions == partition], os.path.join(spill_path, f"partition-{partition}"), f"{chunk_number:08d}")
+
+        report.count('input', total_rows)
+        dtype = common_phone_dtype(dtypes)
+
+        # Keep the row with the most reasons per phone number, ordered by the first row
+        # of each number, then spill the winners into ranges of that first row
+        for partition in range(partition_count + 1):
+            with report.stage('dedup'):
+                part = read_spill(os.path.join(spill_path, f"partition-{partition}"))
+                if part is None:
+                    continue
+
+                if dtype:
+                    part['phone_number'] = pd.to_numeric(part['phone_number']).astype(dtype)
+
+                # Spills are read back in row order, so the groups come out in first seen order.
+                # Blank numbers are dropped by the dedup, like in memory.
+                first_seen = part.index[~part['phone_number'].duplicated() & part['phone_number'].notna()]
+                winners = part.iloc[longest_reason_rows(part['phone_number'], part['reason_for_removal'].to_numpy())]
+                winners.index = pd.Index(first_seen, name='row_order')
+
+            with report.stage('suppression'):
+                winners = clean_contact_id(winners, id_index)
+
+            with report.stage('dedup'):
+                ranges = winners.index.to_numpy() * partition_count // max(total_rows, 1)
+                for output_range in np.unique(ranges):
+                    write_spill(winners[ranges == output_range], os.path.join(spill_path, f"range-{output_range}"), f"{partition:08d}")
+
+        # Stream the ranges to the output file in row order
+        header = True
+        with report.stage('export'):
+            for output_range in range(partition_count):
+                output_df = read_spill(os.path.join(spill_path, f"range-{output_range}"))
+                if output_df is None:
+                    continue
+
+                output_df = title_case_names(output_df.sort_index())
+                output_df['reason_for_removal'] = decode_reasons(output_df['reason_for_removal'])
+                output_df[OUTPUT_COLUMNS].to_csv(output_path, index=False, mode='w' if header else 'a', header=header)
+                report.count('output', len(output_df))
+                header = False
+
+            if header:
+                pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(output_path, index=False)
+
+
+def process_file(file: str, save_path: str, run_mode: str,
+                 phone_index: SuppressionIndex, id_index: SuppressionIndex,
+                 chunk_size: int = None, run_date: date = None, run_stages: dict = None) -> None:
+
+    print(f"Processing file {file}")
+
+    # The report starts from the timings of the stages shared by the whole run
+    report = RunReport(run_stages)
+
+    # Oversized CSV inputs are streamed so memory stays bounded
+    if file.endswith('.csv') and (chunk_size or os.path.getsize(file) > CHUNKED_FILE_SIZE):
+        process_file_chunked(file, save_path, run_mode, phone_index, id_index, chunk_size or CHUNK_SIZE, run_date, report)
+    else:
+        with report.stage('read'):
             df = read_file(file)
-            filtered_df = apply_all_filters(df, run_mode)
-            output_df = filtered_df[filtered_df['phone_number'].isin(valid_phone_set) == False]
-            final_df = clean_contact_id(output_df, valid_id_set)
+        report.count('input', len(df))
+
+        filtered_df = apply_all_filters(df, run_mode, DateWindow(run_date), report)
 
+        with report.stage('suppression'):
+            output_df = filtered_df[~phone_index.contains(filtered_df['phone_number'])]
+            final_df = clean_contact_id(output_df, id_index)
+
+        with report.stage('export'):
             export_output(final_df, file, save_path)
+        report.count('output', len(final_df))
+
+    write_report(report, file, save_path, run_mode, run_date)
+
+def write_report(report: RunReport, file: str, save_path: str, run_mode: str, run_date: date = None) -> None:
+
+    filename = os.path.splitext(os.path.basename(file))[0]
+    report_path = f"{save_path}/(Cleanup Report) {filename}.json"
+
+    report.write(report_path,
+                 file=os.path.basename(file),
+                 run_mode=run_mode,
+                 run_date=str(run_date or datetime.now().date()))
+
+    print(f"Cleanup report saved to {report_path}")
+
+def share_index(index: SuppressionIndex, directory: str, name: str) -> str:
+
+    # Snapshots are already on disk, anything else is written once for the workers to map
+    if isinstance(index.values, np.memmap):
+        return index.values.filename
+
+    path = os.path.join(directory, f"{name}.npy")
+    np.save(path, index.values)
+    return path
+
+def init_worker(phone_index_path: str, id_index_path: str) -> None:
+    global worker_phone_index, worker_id_index
+    worker_phone_index = SuppressionIndex(np.load(phone_index_path, mmap_mode='r'))
+    worker_id_index = SuppressionIndex(np.load(id_index_path, mmap_mode='r'))
+
+def process_file_in_worker(file: str, save_path: str, run_mode: str,
+                           chunk_size: int = None, run_date: date = None, run_stages: dict = None) -> None:
+    process_file(file, save_path, run_mode, worker_phone_index, worker_id_index, chunk_size, run_date, run_stages)
+
+def process_files_in_pool(files: tuple, save_path: str, run_mode: str,
+                          phone_index: SuppressionIndex, id_index: SuppressionIndex,
+                          workers: int, chunk_size: int = None, run_date: date = None,
+                          run_stages: dict = None) -> None:
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as index_path:
+        initargs = (share_index(phone_index, index_path, 'phones'), share_index(id_index, index_path, 'ids'))
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    initializer=init_worker,
+                                                    initargs=initargs) as executor:
+            futures = [executor.submit(process_file_in_worker, file, save_path, run_mode, chunk_size, run_date, run_stages)
+                       for file in files]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+
+def main(auth_code: str, files: tuple, save_path: str, run_mode: str, chunk_size: int = None, workers: int = None):
+
+    try:
+        # Every file of the run measures its date windows from the same day
+        run_date = datetime.now().date()
+        run_report = RunReport()
+
+        with run_report.stage('download'):
+            content_hashes = download_list_cleaner(auth_code)
+
+        with run_report.stage('suppression build'):
+            valid_phone_set = get_phone_set(run_mode, content_hashes)
+            valid_id_set = get_id_set(content_hashes)
+
+        # Fan the files out to worker processes that map the suppression indexes from disk.
+        # Serial unless asked for, since every worker holds a whole input file in memory.
+        if workers and workers > 1 and len(files) > 1:
+            process_files_in_pool(files, save_path, run_mode, valid_phone_set, valid_id_set,
+                                  min(workers, len(files)), chunk_size, run_date, run_report.stages)
+        else:
+            for file in files:
+                process_file(file, save_path, run_mode, valid_phone_set, valid_id_set, chunk_size, run_date,
+                             run_report.stages)
         
         print("Successfully processed all files")
 
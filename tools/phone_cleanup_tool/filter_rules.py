@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from functools import lru_cache
+from pandas.tseries.api import guess_datetime_format
+from typing import Callable, NamedTuple
+
+ALL_RUN_MODES = ('call_marketing', 'text_marketing', 'recleaning')
+
+# How an input column is prepared before the predicates see it
+RAW = 'raw'
+UPPER = 'upper'
+NUMERIC = 'numeric'
+DATE = 'date'
+
+
+class FilterRule(NamedTuple):
+    reason: str
+    columns: tuple
+    predicate: Callable
+    run_modes: tuple = ALL_RUN_MODES
+
+
+class FilterPlan(NamedTuple):
+    rules: tuple
+    inputs: tuple
+
+
+class DateWindow:
+
+    # Dates are parsed once per column into whole days before the run date, so every
+    # "within N days" rule is an integer comparison. Missing dates become -1.
+    def __init__(self, run_date: date = None):
+        self.run_day = np.datetime64(run_date or datetime.now().date(), 'D')
+        self.formats = {}
+
+    def infer_format(self, column: str, series: pd.Series) -> str:
+
+        # The format is guessed from the first date, the same way pandas does, and reused
+        # for the rest of the file's chunks
+        if column not in self.formats:
+            first_value = series.dropna().head(1)
+            if len(first_value) and isinstance(first_value.iloc[0], str):
+                self.formats[column] = guess_datetime_format(first_value.iloc[0])
+            else:
+                self.formats[column] = None
+
+        return self.formats[column]
+
+    def days_ago(self, column: str, series: pd.Series) -> np.ndarray:
+
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            dates = series
+        else:
+            dates = pd.to_datetime(series, errors='coerce', format=self.infer_format(column, series))
+
+        # Use the wall clock date of timezone aware values, like `.dt.date` would
+        if getattr(dates.dt, 'tz', None) is not None:
+            dates = dates.dt.tz_localize(None)
+
+        days = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        days_ago = (self.run_day - days).astype(np.int64)
+        days_ago[np.isnat(days)] = -1
+
+        return days_ago.astype(np.int32)
+
+
+def within_days(days_ago: np.ndarray, days: int) -> np.ndarray:
+    return (days_ago >= 0) & (days_ago <= days)
+
+
+def prepare_column(series: pd.Series, kind: str, date_window: DateWindow) -> pd.Series:
+
+    if kind == UPPER:
+        return series.astype('string').str.upper()
+
+    elif kind == NUMERIC:
+        return pd.to_numeric(series, errors='coerce')
+
+    elif kind == DATE:
+        return date_window.days_ago(series.name, series)
+
+    return series
+
+
+# The order of this registry is the order the reasons are reported in
+FILTER_RULES = (
+    FilterRule('in_pipedrive is Y',
+               (('in_pipedrive', UPPER),),
+               lambda in_pipedrive: in_pipedrive == 'Y'),
+    FilterRule('rc_pd is Yes',
+               (('rc_pd', UPPER),),
+               lambda rc_pd: rc_pd == 'YES'),
+    FilterRule('Both type & carrier_type are Landline',
+               (('type', UPPER), ('carrier_type', UPPER)),
+               lambda type_, carrier_type: (type_ == 'LANDLINE') & (carrier_type == 'LANDLINE'),
+               ('text_marketing',)),
+    FilterRule('text_opt_in is No',
+               (('text_opt_in', UPPER),),
+               lambda text_opt_in: text_opt_in == 'NO'),
+    FilterRule('contact_deal_id Not Empty',
+               (('contact_deal_id', RAW),),
+               lambda column: column.notna()),
+    FilterRule('contact_deal_status Not Empty',
+               (('contact_deal_status', RAW),),
+               lambda column: column.notna()),
+    FilterRule('contact_person_id Not Empty',
+               (('contact_person_id', RAW),),
+               lambda column: column.notna()),
+    FilterRule('phone_number_deal_id Not Empty',
+               (('phone_number_deal_id', RAW),),
+               lambda column: column.notna()),
+    FilterRule('phone_number_deal_status Not Empty',
+               (('phone_number_deal_status', RAW),),
+               lambda column: column.notna()),
+    FilterRule('RVM - Last RVM Date - last 7 days from tool run date',
+               (('RVM - Last RVM Date', DATE),),
+               lambda days_ago: within_days(days_ago, 7)),
+    FilterRule('Latest Text Marketing Date (Sent) - last 7 days from tool run date',
+               (('Latest Text Marketing Date (Sent)', DATE),),
+               lambda days_ago: within_days(days_ago, 7),
+               ('text_marketing',)),
+    FilterRule('Rolling 30 Days Max Outbound Count and Rolling 30 Days Text Marketing Count - total >= 3',
+               (('Rolling 30 Days Max Outbound Count', NUMERIC), ('Rolling 30 Days Text Marketing Count', NUMERIC)),
+               lambda outbound, text_marketing: (outbound + text_marketing) >= 3),
+    FilterRule('Deal - ID Not Empty',
+               (('Deal - ID', RAW),),
+               lambda column: column.notna()),
+    FilterRule('Deal - Text Opt-in is No',
+               (('Deal - Text Opt-in', UPPER),),
+               lambda text_opt_in: text_opt_in.str.contains('NO', na=False)),
+    FilterRule('Latest Text Marketing Date (Sent) - last 30 days from tool run date',
+               (('Latest Text Marketing Date (Sent)', DATE),),
+               lambda days_ago: within_days(days_ago, 30),
+               ('call_marketing',)),
+    FilterRule('Latest Text Marketing Date (Received) - last 30 days from tool run date',
+               (('Latest Text Marketing Date (Received)', DATE),),
+               lambda days_ago: within_days(days_ago, 30),
+               ('call_marketing',)),
+    FilterRule('RVM - Last Reason for Failure is either Not Covered, Removed, Do not Dial List removed',
+               (('RVM - Last Reason for Failure', RAW),),
+               lambda reasons: reasons.isin(["Not Covered", "Removed", "Do not Dial List removed"]),
+               ('call_marketing',))
+)
+
+# Each reason owns one bit of the uint32 reason code
+REMOVAL_REASONS = tuple(rule.reason for rule in FILTER_RULES)
+
+
+@lru_cache(maxsize=None)
+def compile_plan(columns: tuple, run_mode: str) -> FilterPlan:
+
+    # Keep the rules whose columns all exist in this schema and that apply to the run mode
+    available = set(columns)
+    rules = tuple(
+        (np.uint32(1 << bit), rule) for bit, rule in enumerate(FILTER_RULES)
+        if run_mode in rule.run_modes and all(column in available for column, _ in rule.columns)
+    )
+
+    # Every (column, preparation) pair is computed once even if several rules share it
+    inputs = tuple(dict.fromkeys(key for _, rule in rules for key in rule.columns))
+
+    return FilterPlan(rules, inputs)
+
+
+def tag_rows(df: pd.DataFrame, run_mode: str, date_window: DateWindow = None) -> np.ndarray:
+
+    date_window = date_window or DateWindow()
+    plan = compile_plan(tuple(df.columns), run_mode)
+    prepared = {(column, kind): prepare_column(df[column], kind, date_window) for column, kind in plan.inputs}
+
+    codes = np.zeros(len(df), dtype=np.uint32)
+    for bit, rule in plan.rules:
+        mask = rule.predicate(*(prepared[key] for key in rule.columns))
+        codes[pd.Series(mask).fillna(False).to_numpy(dtype=bool)] |= bit
+
+    return codes
+
+
+def decode_reasons(codes: pd.Series) -> pd.Series:
+
+    # Only the distinct codes are decoded, then mapped back onto the rows
+    decoded = {
+        code: ', '.join(reason for bit, reason in enumerate(REMOVAL_REASONS) if code >> bit & 1)
+        for code in pd.unique(codes)
+    }
+    return codes.map(decoded)
@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import threading
+import concurrent.futures
+import dropbox
+import numpy as np
+import pandas as pd
+
+VALID_PHONE_PATTERN = r'\d{10,15}'
+SNAPSHOT_HASH_LENGTH = 16
+MAX_DOWNLOAD_WORKERS = 4
+
+LIST_CLEANER_DROPBOX_PATH = "/List Cleaner & JC DNC"
+LIST_CLEANER_MANIFEST_PATH = "./data/list_cleaner_manifest.json"
+LIST_CLEANER_SHEETS = [
+    "CCM+CH+MVPC+MVPT+JC+RC+PD (Cold)",
+    "DNC (Cold-PD)",
+    "UniqueDB ID (Cold)",
+    "CallOut-14d+TextOut-30d (Cold)",
+    "CallTextOut-7d (PD)",
+    "PDConvDup (PD)",
+    "PDJRAADups (PD)"
+]
+
+
+def to_int64_keys(column: pd.Series) -> 'tuple[np.ndarray, np.ndarray]':
+
+    # Returns the int64 keys of a column and a mask of the entries that are whole numbers
+    numbers = pd.to_numeric(column, errors='coerce')
+
+    if pd.api.types.is_integer_dtype(numbers.dtype):
+        valid = numbers.notna().to_numpy()
+        keys = numbers.to_numpy(dtype=np.int64, na_value=0)
+        return keys, valid
+
+    floats = numbers.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = np.isfinite(floats) & (floats == np.floor(floats)) & (np.abs(floats) < 2 ** 63)
+    keys = np.where(valid, floats, 0).astype(np.int64)
+    return keys, valid
+
+
+class SuppressionIndex:
+
+    def __init__(self, values: np.ndarray):
+        # Sorted and unique int64 keys
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_phones(cls, phones: pd.Series) -> 'SuppressionIndex':
+        phones = phones.dropna().astype(str)
+        valid_phones = phones[phones.str.fullmatch(VALID_PHONE_PATTERN)]
+        return cls(np.unique(valid_phones.astype(np.int64).to_numpy()))
+
+    @classmethod
+    def from_numbers(cls, numbers: pd.Series) -> 'SuppressionIndex':
+        keys, valid = to_int64_keys(numbers)
+        return cls(np.unique(keys[valid]))
+
+    @classmethod
+    def union(cls, indexes: list) -> 'SuppressionIndex':
+        if len(indexes) == 1:
+            return indexes[0]
+        return cls(np.unique(np.concatenate([index.values for index in indexes])))
+
+    def contains(self, column: pd.Series) -> np.ndarray:
+        keys, valid = to_int64_keys(column)
+
+        if not len(self.values):
+            return np.zeros(len(keys), dtype=bool)
+
+        positions = np.searchsorted(self.values, keys)
+        positions[positions == len(self.values)] = 0
+        return valid & (self.values[positions] == keys)
+
+
+class PhoneSourceIndex:
+
+    def __init__(self, values: np.ndarray, sources: np.ndarray):
+        # Sorted and unique int64 phones, with a bitmask of the sources each phone is in
+        self.values = values
+        self.sources = sources
+
+    @classmethod
+    def from_sources(cls, sources: dict) -> 'PhoneSourceIndex':
+
+        # Takes {source bit: int64 phones} and merges them into one sorted index
+        phones = {bit: np.asarray(values, dtype=np.int64) for bit, values in sources.items()}
+        values = np.unique(np.concatenate([np.empty(0, dtype=np.int64), *phones.values()]))
+
+        bitmasks = np.zeros(len(values), dtype=np.uint8)
+        for bit, source_phones in phones.items():
+            bitmasks[np.searchsorted(values, source_phones)] |= bit
+
+        return cls(values, bitmasks)
+
+    def lookup(self, column: pd.Series) -> np.ndarray:
+
+        # Source bitmask of every entry, 0 where the phone is in none of the sources
+        keys, valid = to_int64_keys(column)
+
+        if not len(self.values):
+            return np.zeros(len(keys), dtype=np.uint8)
+
+        positions = np.searchsorted(self.values, keys)
+        positions[positions == len(self.values)] = 0
+        found = valid & (self.values[positions] == keys)
+        return np.where(found, self.sources[positions], 0).astype(np.uint8)
+
+
+def read_phone_column(path: str) -> pd.Series:
+    return pd.read_csv(path, header=None, usecols=[0], dtype=str)[0]
+
+
+def snapshot_path(csv_path: str, content_hash: str) -> str:
+    root, _ = os.path.splitext(csv_path)
+    return f"{root}.{content_hash[:SNAPSHOT_HASH_LENGTH]}.npy"
+
+
+def load_snapshot(csv_path: str, content_hash: str, build) -> SuppressionIndex:
+
+    # Without a Dropbox content hash there is nothing to key a snapshot on
+    if not content_hash:
+        return build(csv_path)
+
+    path = snapshot_path(csv_path, content_hash)
+    if not os.path.exists(path):
+        index = build(csv_path)
+
+        def write(temp_path: str) -> None:
+            with open(temp_path, 'wb') as f:
+                np.save(f, index.values)
+
+        # The snapshots of previous versions of the sheet are dropped
+        base, _ = os.path.splitext(os.path.basename(csv_path))
+        write_atomic(path, write, re.compile(fr"{re.escape(base)}\.[0-9a-f]{{{SNAPSHOT_HASH_LENGTH}}}\.npy"))
+
+    return SuppressionIndex(np.load(path, mmap_mode='r'))
+
+
+def load_sheet_phones(csv_path: str, content_hash: str = None) -> SuppressionIndex:
+    return load_snapshot(csv_path, content_hash,
+                         lambda path: SuppressionIndex.from_phones(read_phone_column(path)))
+
+
+def load_sheet_ids(csv_path: str, content_hash: str = None) -> SuppressionIndex:
+    return load_snapshot(csv_path, content_hash,
+                         lambda path: SuppressionIndex.from_numbers(
+                             pd.read_csv(path, low_memory=False)['Deal - Unique Database ID']))
+
+
+class SuppressionCatalog:
+
+    # Parses each list cleaner sheet the first time a union asks for it and reuses it after that,
+    # so sheets that the run never needs are never read
+    def __init__(self, content_hashes: dict = None, data_path: str = './data'):
+        self.content_hashes = content_hashes or {}
+        self.data_path = data_path
+        self.sheets = {}
+
+    def sheet(self, file_name: str, load) -> SuppressionIndex:
+        if file_name not in self.sheets:
+            self.sheets[file_name] = load(os.path.join(self.data_path, file_name), self.content_hashes.get(file_name))
+        return self.sheets[file_name]
+
+    def phones(self, file_names: list) -> SuppressionIndex:
+        return SuppressionIndex.union([self.sheet(file_name, load_sheet_phones) for file_name in file_names])
+
+    def ids(self, file_name: str) -> SuppressionIndex:
+        return self.sheet(file_name, load_sheet_ids)
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest: dict, path: str) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def remove_stale_files(directory: str, pattern: re.Pattern, keep: set = frozenset()) -> None:
+
+    # Only whole file names are matched, so files of another source that share a prefix are left alone
+    for name in os.listdir(directory):
+        if name not in keep and pattern.fullmatch(name):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def write_atomic(path: str, write, stale_pattern: re.Pattern = None) -> None:
+
+    # For cache files named after their content. Written under a temporary name first so a
+    # half-written file is never loaded.
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(temp_path)
+
+    try:
+        os.replace(temp_path, path)
+    except OSError:
+        # Another run wrote the same file first and still has it open
+        os.remove(temp_path)
+
+    # Drop the previous versions of the file
+    if stale_pattern:
+        remove_stale_files(os.path.dirname(path) or '.', stale_pattern, {os.path.basename(path)})
+
+
+def local_file_state(path: str) -> dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def list_remote_files(dbx: dropbox.Dropbox, folder_path: str) -> dict:
+
+    response = dbx.files_list_folder(folder_path)
+    entries = list(response.entries)
+    while response.has_more:
+        response = dbx.files_list_folder_continue(response.cursor)
+        entries.extend(response.entries)
+
+    return {entry.name: entry for entry in entries if isinstance(entry, dropbox.files.FileMetadata)}
+
+
+def download_list_cleaner(auth_code: str, data_path: str = './data', sheet_names: list = None) -> dict:
+
+    print("Downloading list cleaner files")
+
+    dbx = dropbox.Dropbox(auth_code)
+    manifest = read_manifest(LIST_CLEANER_MANIFEST_PATH)
+
+    # One listing call gives the rev and content hash of every sheet
+    remote_files = list_remote_files(dbx, LIST_CLEANER_DROPBOX_PATH)
+
+    changed_files = []
+    for sheet_name in sheet_names or LIST_CLEANER_SHEETS:
+        file_name = f"{sheet_name}.csv"
+        local_file_path = os.path.join(data_path, file_name)
+        remote_file = remote_files.get(file_name)
+        recorded = manifest.get(file_name, {})
+
+        # Skip sheets whose local copy is still the remote revision we last downloaded
+        if remote_file and os.path.exists(local_file_path) \
+                and recorded.get('rev') == remote_file.rev \
+                and recorded.get('content_hash') == remote_file.content_hash \
+                and recorded.get('local') == local_file_state(local_file_path):
+            continue
+
+        changed_files.append(file_name)
+
+    def download(file_name: str):
+        local_file_path = os.path.join(data_path, file_name)
+        metadata = dbx.files_download_to_file(local_file_path, f"{LIST_CLEANER_DROPBOX_PATH}/{file_name}")
+        return file_name, metadata, local_file_state(local_file_path)
+
+    if changed_files:
+        print(f"Downloading {len(changed_files)} updated list cleaner file(s)")
+    else:
+        print("List cleaner files are up to date")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        for file_name, metadata, local_state in executor.map(download, changed_files):
+            manifest[file_name] = {
+                'rev': metadata.rev,
+                'content_hash': metadata.content_hash,
+                'local': local_state
+            }
+
+    write_manifest(manifest, LIST_CLEANER_MANIFEST_PATH)
+
+    # Content hash of each local sheet, used to key the parsed snapshots
+    return {file_name: entry['content_hash'] for file_name, entry in manifest.items()}
@@ -0,0 +1,54 @@
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from .filter_rules import REMOVAL_REASONS
+
+
+class RunReport:
+
+    # Collects the wall time of each stage of a run, row counts and how many rows each
+    # filter rule matched, then saves them as a JSON file next to the output
+    def __init__(self, stages: dict = None):
+        self.stages = dict(stages or {})
+        self.rows = {}
+        self.matched_rows = np.zeros(len(REMOVAL_REASONS), dtype=np.int64)
+        self.unique_rows = np.zeros(len(REMOVAL_REASONS), dtype=np.int64)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, rows: int) -> None:
+        self.rows[name] = self.rows.get(name, 0) + rows
+
+    def count_reasons(self, codes: np.ndarray) -> None:
+
+        # A row is uniquely removed by a rule when that rule is its only reason
+        for bit in range(len(REMOVAL_REASONS)):
+            mask = np.uint32(1 << bit)
+            self.matched_rows[bit] += np.count_nonzero(codes & mask)
+            self.unique_rows[bit] += np.count_nonzero(codes == mask)
+
+    def write(self, path: str, **details) -> None:
+
+        report = {
+            **details,
+            'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            'rows': self.rows,
+            'rules': [
+                {
+                    'reason': reason,
+                    'matched_rows': int(self.matched_rows[bit]),
+                    'unique_rows': int(self.unique_rows[bit])
+                }
+                for bit, reason in enumerate(REMOVAL_REASONS)
+            ]
+        }
+
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)